@@ -6,12 +6,54 @@ export async function fetchAllUsers() {
   return res.json() as Promise<{ users: Array<{ user_id: string; name: string; email: string; role: string }> }>;
 }
 
+// GET /users page; pass next_cursor back until it is null
+export async function fetchUsersPage(limit: number, cursor?: string | null) {
+  const query = `?limit=${limit}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
+  const res = await fetch(`${BASE_URL}/users${query}`);
+  if (!res.ok) throw new Error(`Failed: ${res.status}`);
+  return res.json() as Promise<{
+    users: Array<{ user_id: string; name: string; email: string; role: string }>;
+    next_cursor: string | null;
+  }>;
+}
+
 export async function fetchDashboard(userId: string) {
   const res = await fetch(`${BASE_URL}/users/${userId}/dashboard`);
   if (!res.ok) throw new Error(`Failed: ${res.status}`);
   return res.json();
 }
 
+export async function fetchDashboards(ids?: string[]) {
+  const query = ids ? `?ids=${ids.map(encodeURIComponent).join(",")}` : "";
+  const res = await fetch(`${BASE_URL}/dashboards${query}`);
+  if (!res.ok) throw new Error(`Failed: ${res.status}`);
+  return res.json() as Promise<{
+    dashboards: Array<{ user_id: string; name: string; role: string; [key: string]: any }>;
+    missing: string[];
+  }>;
+}
+
+// Users per GET /dashboards request: under the backend's MAX_BATCH_DASHBOARDS (500)
+// and short enough to keep the ?ids= URL well inside proxy limits
+const DASHBOARD_BATCH = 200;
+
+// Every member's dashboard, one page of users (and one batch request) at a time
+export async function fetchAllDashboards() {
+  const dashboards: Awaited<ReturnType<typeof fetchDashboards>>["dashboards"] = [];
+  const missing: string[] = [];
+  let cursor: string | null = null;
+  do {
+    const page = await fetchUsersPage(DASHBOARD_BATCH, cursor);
+    if (page.users.length > 0) {
+      const batch = await fetchDashboards(page.users.map(user => user.user_id));
+      dashboards.push(...batch.dashboards);
+      missing.push(...batch.missing);
+    }
+    cursor = page.next_cursor;
+  } while (cursor);
+  return { dashboards, missing };
+}
+
 export async function submitUpdate(
   userId: string,
   payload: { text: string; project_id?: string; update_type?: "wet" | "dry" }
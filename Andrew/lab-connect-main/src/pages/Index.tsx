@@ -1,5 +1,5 @@
 import { useEffect, useState } from 'react';
-import { fetchAllUsers, fetchDashboard } from '@/lib/api';
+import { fetchAllDashboards } from '@/lib/api';
 import { LabMember } from '@/types/labMember';
 import MemberCard from '@/components/MemberCard';
 
@@ -11,21 +11,18 @@ export default function Index() {
   useEffect(() => {
     const loadMembers = async () => {
       try {
-        const { users } = await fetchAllUsers();
-        const memberDashboards = await Promise.all(
-          users.map(user => fetchDashboard(user.user_id))
-        );
+        // Paged through GET /users, one batch dashboard request per page
+        const { dashboards } = await fetchAllDashboards();
 
-        const membersData: LabMember[] = users.map((user, idx) => {
-          const dash = memberDashboards[idx];
+        const membersData: LabMember[] = dashboards.map(dash => {
           const projectDesc = dash.project_descriptions || {};
           const wetUpdates = dash.wet_updates || {};
           const dryUpdates = dash.dry_updates || {};
 
           return {
-            id: user.user_id,
-            name: user.name,
-            role: user.role,
+            id: dash.user_id,
+            name: dash.name,
+            role: dash.role,
             labType: 'wet',
             projectDescription: projectDesc.description || projectDesc.Name || 'No project description',
             recentUpdate: wetUpdates.latest?.summary || 'No recent updates',
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+bench_backends.py
+
+Load benchmark for the Flask backends (src/user or hack_3).
+
+Builds the app with create_app() inside a temporary directory (so Data/ is
+throwaway), seeds N users with M updates each, then drives a mixed
+read/write workload through the Flask test client at each thread count
+(one app, like one worker with threads) and at each process count (one
+app per spawned process on the same Data/, like gunicorn workers).
+Gemini is replaced by a deterministic local stub with configurable latency,
+so the hack_3 summarization path runs offline.
+
+Prints one JSON document (throughput + p50/p95/p99 per operation) to stdout.
+
+Examples:
+  python bench/bench_backends.py --app src --users 200 --updates 50 --requests 4000 --threads 1,8
+  python bench/bench_backends.py --app src --threads 8 --processes 2,4,8
+  python bench/bench_backends.py --app hack3 --llm-latency-ms 200 --out bench_hack3.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = {
+    "src": os.path.join(ROOT, "src", "user"),
+    "hack3": os.path.join(ROOT, "hack_3"),
+}
+
+# Operation mix (weights) per backend; see make_ops() for what each op does
+DEFAULT_MIX = {
+    "src": "dashboard=50,append=20,list_users=10,updates_page=10,search=5,batch_dashboards=5",
+    "hack3": "dashboard=60,append=20,batch_dashboards=10,search=10",
+}
+
+WORDS = (
+    "pcr gel buffer primer plasmid clone assay western blot antibody yeast ecoli culture "
+    "sequencing alignment variant pipeline model training dataset notebook cluster gpu "
+    "protocol sample incubation centrifuge ligation transformation qpcr crispr knockout"
+).split()
+
+
+# ---- Stub LLM ----
+
+class StubLLM:
+    """
+    Stands in for the Gemini provider: generate() sleeps `latency` seconds
+    and returns a summary derived from a hash of the prompt (same input,
+    same output). JSON-mode requests get a {"wet": ..., "dry": ...} object.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(
+        self,
+        model: str,
+        system_instruction: str,
+        prompt: str,
+        temperature: float,
+        response_mime_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        if response_mime_type == "application/json":
+            return json.dumps({"wet": f"wet summary {digest}", "dry": f"dry summary {digest}"})
+        return f"summary {digest}"
+
+    def classify(self, error: BaseException) -> Tuple[bool, Optional[float]]:
+        # The stub itself never fails; anything raised is a bug worth surfacing
+        return False, None
+
+    def close(self) -> None:
+        pass
+
+
+def install_stub_llm(stub: StubLLM) -> None:
+    # Backends with an LLM (hack_3) pick their provider from LLM_PROVIDER
+    try:
+        from llm_provider import register_provider
+    except ImportError:
+        return
+    register_provider("stub", lambda **kwargs: stub)
+    os.environ["LLM_PROVIDER"] = "stub"
+
+
+# ---- Seeding ----
+
+def user_ids(n: int) -> List[str]:
+    return [f"u{i:05d}" for i in range(n)]
+
+
+def sentence(rng: random.Random, n_words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def seed_data(n_users: int, n_updates: int, seed: int) -> None:
+    """Writes users, projects and update logs straight into ./Data, sharded (before create_app)."""
+    from data_paths import DataPaths
+    from safe_io import atomic_write_json
+    from update_log import UpdateLog
+    from user_registry import UserRegistry
+
+    rng = random.Random(seed)
+    paths = DataPaths("Data")
+    registry = UserRegistry(paths.shared("users.sqlite3"))
+    for index, user_id in enumerate(user_ids(n_users)):
+        role = "Wet Lab Scientist" if index % 2 == 0 else "Dry Lab Scientist"
+        registry.upsert(user_id, f"User {index}", role)
+        atomic_write_json(
+            paths.user_file(user_id, "projects"),
+            {"Name": f"Project {index}", "description": sentence(rng, 20)},
+        )
+        UpdateLog(
+            paths.user_file(user_id, "updates"),
+            lock_path=paths.lock(user_id),
+            index_path=paths.user_file(user_id, "updates_index"),
+        ).append_many(
+            [
+                {
+                    "Data": f"dataset-{index}-{k}",
+                    "Text_Update": sentence(rng),
+                    "created_at": f"2025-{1 + k % 12:02d}-{1 + k % 28:02d}T09:00:00Z",
+                }
+                for k in range(n_updates)
+            ]
+        )
+
+
+# ---- Workload ----
+
+def make_ops(app_name: str, ids: List[str]) -> Dict[str, Callable[[Any, random.Random], Any]]:
+    """op name -> fn(client, rng) that issues one request and returns the response."""
+
+    def dashboard(client, rng):
+        return client.get(f"/users/{rng.choice(ids)}/dashboard")
+
+    def append(client, rng):
+        return client.post(
+            f"/users/{rng.choice(ids)}/updates",
+            json={"Data": f"bench-{rng.randrange(10**9)}", "Text_Update": sentence(rng)},
+        )
+
+    def list_users(client, rng):
+        return client.get("/users?limit=100")
+
+    def updates_page(client, rng):
+        return client.get(f"/users/{rng.choice(ids)}/updates?limit=50")
+
+    def search(client, rng):
+        return client.get(f"/search?q={rng.choice(WORDS)}&limit=20")
+
+    def batch_dashboards(client, rng):
+        return client.get("/dashboards?ids=" + ",".join(rng.sample(ids, min(20, len(ids)))))
+
+    ops = {
+        "dashboard": dashboard,
+        "append": append,
+        "search": search,
+        "batch_dashboards": batch_dashboards,
+    }
+    if app_name == "src":
+        ops.update({"list_users": list_users, "updates_page": updates_page})
+    return ops
+
+
+def parse_mix(text: str, ops: Dict[str, Any]) -> List[Tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ops:
+            raise SystemExit(f"Unknown op '{name}' for this backend; choose from {', '.join(sorted(ops))}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # Nearest-rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies: List[float], errors: int) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+        "max_ms": round(1000 * values[-1], 3) if values else 0.0,
+    }
+
+
+def drive(
+    client: Any,
+    ops: Dict[str, Callable],
+    mix: List[Tuple[str, float]],
+    rng: random.Random,
+    n_requests: int,
+) -> Tuple[Dict[str, List[float]], Dict[str, int], List[str]]:
+    """Issues `n_requests` mixed requests; returns (latencies, errors, job_ids) per op."""
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    job_ids: List[str] = []
+    for _ in range(n_requests):
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        resp = ops[name](client, rng)
+        body = resp.get_data()  # include streamed bodies in the timing
+        latencies[name].append(time.perf_counter() - start)
+        if resp.status_code >= 400:
+            errors[name] += 1
+        elif resp.status_code == 202:
+            job_ids.append(json.loads(body)["job_id"])
+    return latencies, errors, job_ids
+
+
+def split_requests(total_requests: int, workers: int) -> List[int]:
+    return [total_requests // workers + (1 if i < total_requests % workers else 0) for i in range(workers)]
+
+
+def make_result(
+    key: str,
+    workers: int,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+    elapsed: float,
+) -> Dict[str, Any]:
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        key: workers,
+        "requests": len(all_latencies),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(all_latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "overall": summarize_latencies(all_latencies, sum(errors.values())),
+        "ops": {name: summarize_latencies(latencies[name], errors[name]) for name in latencies if latencies[name]},
+    }
+
+
+def run_workload(
+    app: Any,
+    ops: Dict[str, Callable],
+    mix: List[Tuple[str, float]],
+    threads: int,
+    total_requests: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """Threads sharing one in-process app (one gunicorn worker with --threads)."""
+    latencies: Dict[str, List[float]] = {name: [] for name, _ in mix}
+    errors: Dict[str, int] = {name: 0 for name, _ in mix}
+    job_ids: List[str] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index: int, n_requests: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        barrier.wait()
+        local, local_errors, local_jobs = drive(client, ops, mix, rng, n_requests)
+        with lock:
+            for name in latencies:
+                latencies[name].extend(local[name])
+                errors[name] += local_errors[name]
+            job_ids.extend(local_jobs)
+
+    pool = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(split_requests(total_requests, threads))]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    result = make_result("threads", threads, latencies, errors, elapsed)
+    if job_ids:
+        result["summarize"] = drain_jobs(app, job_ids)
+    return result
+
+
+def process_worker(
+    app_name: str,
+    workdir: str,
+    llm_latency: float,
+    n_users: int,
+    mix_text: str,
+    index: int,
+    n_requests: int,
+    seed: int,
+    barrier: Any,
+    results: Any,
+    stop: Any,
+) -> None:
+    """
+    One worker process, like a sync gunicorn worker: its own create_app()
+    (caches, locks, job workers) on the shared Data/ directory.
+    """
+    sys.path.insert(0, BACKENDS[app_name])
+    stub = StubLLM(llm_latency)
+    install_stub_llm(stub)
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import create_app
+
+        app = create_app()
+        ops = make_ops(app_name, user_ids(n_users))
+        mix = parse_mix(mix_text, ops)
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + 500 + index)
+        barrier.wait()
+        latencies, errors, job_ids = drive(client, ops, mix, rng, n_requests)
+        results.put((latencies, errors, job_ids))
+        # Stay up (and keep running queued recomputes) until every job is drained
+        stop.wait()
+        results.put(stub.calls)
+
+
+def run_processes(
+    app: Any,
+    app_name: str,
+    llm_latency: float,
+    n_users: int,
+    mix_text: str,
+    processes: int,
+    total_requests: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """
+    `processes` worker processes on the same Data/ (cwd), each with its own
+    app, so cross-process file locks, sharded paths and the shared job
+    table are exercised for real. Startup is not included in the timing.
+    """
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(processes + 1)
+    results = ctx.Queue()
+    stop = ctx.Event()
+    pool = [
+        ctx.Process(
+            target=process_worker,
+            args=(app_name, os.getcwd(), llm_latency, n_users, mix_text, i, n, seed, barrier, results, stop),
+        )
+        for i, n in enumerate(split_requests(total_requests, processes))
+    ]
+    for p in pool:
+        p.start()
+    try:
+        barrier.wait(timeout=300)
+        start = time.perf_counter()
+        latencies: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        job_ids: List[str] = []
+        for _ in pool:
+            local, local_errors, local_jobs = results.get(timeout=3600)
+            for name in local:
+                latencies.setdefault(name, []).extend(local[name])
+                errors[name] = errors.get(name, 0) + local_errors[name]
+            job_ids.extend(local_jobs)
+        elapsed = time.perf_counter() - start
+
+        result = make_result("processes", processes, latencies, errors, elapsed)
+        if job_ids:
+            result["summarize"] = drain_jobs(app, job_ids)
+        stop.set()
+        result["llm_calls"] = sum(results.get(timeout=60) for _ in pool)
+    finally:
+        stop.set()
+        for p in pool:
+            p.join(timeout=30)
+            if p.is_alive():
+                p.terminate()
+    return result
+
+
+def drain_jobs(app: Any, job_ids: List[str], timeout: float = 600.0) -> Dict[str, Any]:
+    """Waits for queued wet/dry recomputes (hack_3) and reports how long the backlog took."""
+    client = app.test_client()
+    start = time.perf_counter()
+    pending = set(job_ids)
+    failed = 0
+    while pending and time.perf_counter() - start < timeout:
+        for job_id in list(pending):
+            status = client.get(f"/jobs/{job_id}").get_json()["status"]
+            if status in ("done", "failed"):
+                pending.discard(job_id)
+                failed += status == "failed"
+        if pending:
+            time.sleep(0.05)
+    return {
+        "jobs": len(job_ids),
+        "failed": failed,
+        "unfinished": len(pending),
+        "drain_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+# ---- CLI ----
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark the Flask backends with a stub LLM.")
+    ap.add_argument("--app", choices=sorted(BACKENDS), default="src")
+    ap.add_argument("--users", type=int, default=100, help="Synthetic users to seed")
+    ap.add_argument("--updates", type=int, default=50, help="Seeded updates per user")
+    ap.add_argument("--requests", type=int, default=2000, help="Requests per run")
+    ap.add_argument("--threads", default="1,8", help="Comma-separated thread counts, one run each")
+    ap.add_argument(
+        "--processes",
+        default="4",
+        help="Comma-separated worker process counts, one run each on the same Data/ ('' to skip)",
+    )
+    ap.add_argument("--mix", default=None, help="op=weight,... (default depends on --app)")
+    ap.add_argument("--llm-latency-ms", type=float, default=50.0, help="Stub Gemini latency per call")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--keep-data", action="store_true", help="Leave the temp Data/ directory behind")
+    ap.add_argument("--out", default=None, help="Write the JSON report here instead of stdout")
+    return ap.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    thread_counts = [int(t) for t in args.threads.split(",") if t.strip()]
+    process_counts = [int(p) for p in args.processes.split(",") if p.strip()]
+
+    stub = StubLLM(args.llm_latency_ms / 1000.0)
+    sys.path.insert(0, BACKENDS[args.app])
+    install_stub_llm(stub)
+
+    workdir = tempfile.mkdtemp(prefix=f"bench-{args.app}-")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # the backends use cwd-relative Data/ paths
+    try:
+        # Backend progress prints go to stderr so stdout stays valid JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            seed_start = time.perf_counter()
+            seed_data(args.users, args.updates, args.seed)
+            seed_seconds = time.perf_counter() - seed_start
+
+            from app import create_app
+
+            startup_start = time.perf_counter()
+            app = create_app()
+            startup_seconds = time.perf_counter() - startup_start
+
+            ops = make_ops(args.app, user_ids(args.users))
+            mix = parse_mix(args.mix or DEFAULT_MIX[args.app], ops)
+
+            runs = []
+            for threads in thread_counts:
+                print(f"[bench] {args.app}: {args.requests} requests on {threads} thread(s)", file=sys.stderr)
+                runs.append(run_workload(app, ops, mix, threads, args.requests, args.seed))
+
+            process_runs = []
+            for processes in process_counts:
+                print(f"[bench] {args.app}: {args.requests} requests on {processes} process(es)", file=sys.stderr)
+                process_runs.append(
+                    run_processes(
+                        app,
+                        args.app,
+                        stub.latency,
+                        args.users,
+                        args.mix or DEFAULT_MIX[args.app],
+                        processes,
+                        args.requests,
+                        args.seed,
+                    )
+                )
+    finally:
+        os.chdir(cwd)
+        if not args.keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {
+            "app": args.app,
+            "users": args.users,
+            "updates_per_user": args.updates,
+            "requests_per_run": args.requests,
+            "mix": dict(mix),
+            "llm_latency_ms": args.llm_latency_ms,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "data_dir": workdir if args.keep_data else None,
+        "seed_seconds": round(seed_seconds, 3),
+        "startup_seconds": round(startup_seconds, 3),
+        "llm_calls": stub.calls,
+        # Threads share one app; process runs have one app per process (llm_calls counted per run)
+        "runs": runs,
+        "process_runs": process_runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
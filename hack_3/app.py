@@ -3,28 +3,90 @@ from flask import Flask, jsonify, send_from_directory
 from flask_cors import CORS
 from user_class import Lab, User
 from routes import register_user_routes
+from data_paths import DataPaths
+from jobs import JobQueue
+from metrics import REGISTRY, instrument_app
+from generate_wet_dry_json import WetDrySummarizer
+from llm_provider import get_provider
+from summary_cache import SummaryCache
 import os
+import threading
 
 
 def create_app() -> Flask:
     app = Flask(__name__, static_folder='.')
     CORS(app)  # Enable CORS for frontend communication
     
-    lab = Lab()
+    # One summarizer for the whole app: long-lived provider, pool and cache
+    # Data root: $DATA_ROOT, else ./Data
+    paths = DataPaths()
+    summary_cache = SummaryCache(paths.shared("summary_cache.sqlite3"))
+    # The provider's SDK (google-genai by default) is imported on the first summary
+    summarizer = WetDrySummarizer(
+        provider=get_provider(os.environ.get("LLM_PROVIDER", "gemini"), api_key=os.environ.get("gem_key")),
+        cache=summary_cache,
+        latest_first=True,
+        # One JSON call per update for both audiences; SUMMARY_DUAL=0 restores two calls
+        dual=os.environ.get("SUMMARY_DUAL", "1") != "0",
+        # Updates over this many (estimated) tokens are chunked and summarized map-reduce
+        chunk_tokens=int(os.environ.get("SUMMARY_CHUNK_TOKENS", "4000")),
+    )
+    lab = Lab(
+        summarizer=summarizer,
+        consolidated=os.environ.get("DATA_CONSOLIDATED") == "1",
+        data_root=paths.root,
+    )
 
     # Hard-code users at startup (as you requested)
     lab.add_user(User(user_id="123", name="Alice", role="Wet Lab Scientist"))
     lab.add_user(User(user_id="999", name="James", role="Dry Lab Scientist"))
+    # Until a full rebuild of Data/ has completed once, index it in the
+    # background (search results are partial meanwhile) so startup doesn't
+    # wait on it; `python search_index.py` rebuilds from the command line
+    if not lab.search.indexed():
+        threading.Thread(
+            target=lab.rebuild_search_index, kwargs={"if_needed": True}, name="search-rebuild", daemon=True
+        ).start()
 
-    app.register_blueprint(register_user_routes(lab))
+    def recompute(user_id: str) -> None:
+        user = lab.get_user(user_id)
+        if user is None:
+            raise LookupError(f"User {user_id} not found")
+        user.compute_wet_and_dry()
+
+    # Background workers for wet/dry recompute (off the request path). Job
+    # state lives in Data/jobs.sqlite3, so with several gunicorn workers a
+    # job can be polled from any of them and runs in only one.
+    jobs = JobQueue(
+        paths.shared("jobs.sqlite3"),
+        run=recompute,
+        workers=int(os.environ.get("RECOMPUTE_WORKERS", "2")),
+    )
+
+    app.register_blueprint(register_user_routes(lab, jobs))
+
+    # GET /metrics: route latencies, Data/ I/O, Gemini calls and cache counters
+    instrument_app(app)
+    REGISTRY.gauge_function("read_cache_hits", "Read cache hits since start", lambda: lab.cache.hits)
+    REGISTRY.gauge_function("read_cache_misses", "Read cache misses since start", lambda: lab.cache.misses)
+    REGISTRY.gauge_function("summary_cache_hits", "Summary cache hits since start", lambda: summary_cache.hits)
+    REGISTRY.gauge_function("summary_cache_misses", "Summary cache misses since start", lambda: summary_cache.misses)
+    REGISTRY.gauge_function(
+        "llm_circuit_open",
+        "1 while the Gemini circuit breaker is failing calls fast",
+        lambda: 0.0 if summarizer.breaker.status()["state"] == "closed" else 1.0,
+    )
 
     @app.get("/")
     def index():
         return send_from_directory('.', 'index.html')
 
+    # Still 200 while Gemini is down: reads keep working, only summaries wait
     @app.get("/health")
     def health():
-        return jsonify({"status": "ok"})
+        llm = summarizer.breaker.status()
+        status = "ok" if llm["state"] == "closed" else "degraded"
+        return jsonify({"status": status, "read_cache": lab.cache.stats(), "llm": llm})
 
     return app
 
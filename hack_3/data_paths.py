@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from safe_io import atomic_write_json, write_lock
+
+# kind -> (subdirectory, file name suffix after the user_id)
+FILES: Dict[str, Tuple[str, str]] = {
+    "projects": ("project_descriptions", "_projects.json"),
+    "updates": ("updates", "_updates.jsonl"),
+    "updates_index": ("updates", "_updates_index.json"),
+    "legacy_updates": ("updates", "_updates.json"),
+    "legacy_updates_migrated": ("updates", "_updates.json.migrated"),
+    "wet": ("updates", "_wet_updates.json"),
+    "dry": ("updates", "_dry_updates.json"),
+    "summary_state": ("updates", "_summary_state.json"),
+    "record": ("records", "_record.json"),
+}
+
+# Longest suffix first, so "_wet_updates.json" wins over "_updates.json"
+_SUFFIXES = sorted(((suffix, kind) for kind, (_, suffix) in FILES.items()), key=lambda x: -len(x[0]))
+
+
+class DataPaths:
+    """
+    Where every Data/ file lives. Per-user files are sharded by a hash
+    prefix of the user_id so no directory grows past a few hundred entries:
+      {root}/updates/3f/{user_id}_updates.jsonl
+      {root}/project_descriptions/3f/{user_id}_projects.json
+    Shared files (SQLite databases) sit directly under {root}.
+
+    Files written by older versions live flat ({root}/updates/{user_id}_...).
+    Until the migration is finished ({root}/layout.json exists), readers
+    fall back to the flat location and writers move a file into its shard
+    (claim()) before touching it. `python data_paths.py migrate` moves the
+    rest while the service keeps running.
+    """
+
+    def __init__(self, root: Optional[str] = None, levels: int = 1):
+        self.root = root or os.environ.get("DATA_ROOT", "Data")
+        self.levels = levels
+        self._migrated = False
+
+    # -------------------------
+    # LOCATIONS
+    # -------------------------
+    def shard(self, user_id: str) -> str:
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(*(digest[2 * i:2 * i + 2] for i in range(self.levels)))
+
+    def user_file(self, user_id: str, kind: str) -> str:
+        directory, suffix = FILES[kind]
+        return os.path.join(self.root, directory, self.shard(user_id), f"{user_id}{suffix}")
+
+    def legacy_file(self, user_id: str, kind: str) -> str:
+        directory, suffix = FILES[kind]
+        return os.path.join(self.root, directory, f"{user_id}{suffix}")
+
+    def lock(self, user_id: str, name: str = "") -> str:
+        """Lock file for a user's writers (`name` selects a separate lock, e.g. "recompute")."""
+        suffix = f".{name}" if name else ""
+        return os.path.join(self.root, "locks", self.shard(user_id), f"{user_id}{suffix}.lock")
+
+    def shared(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    # -------------------------
+    # MIGRATION
+    # -------------------------
+    @property
+    def marker(self) -> str:
+        return os.path.join(self.root, "layout.json")
+
+    def migrated(self) -> bool:
+        # Once the marker exists it never goes away, so stop checking
+        if not self._migrated:
+            self._migrated = os.path.exists(self.marker)
+        return self._migrated
+
+    def resolve(self, user_id: str, kind: str) -> str:
+        """
+        Path to read `kind` from: the sharded file, or the flat one if it
+        hasn't been moved yet.
+        """
+        path = self.user_file(user_id, kind)
+        if self.migrated() or os.path.exists(path):
+            return path
+        legacy = self.legacy_file(user_id, kind)
+        return legacy if os.path.exists(legacy) else path
+
+    def claim(self, user_id: str, kind: str) -> str:
+        """
+        Moves a flat file into its shard and returns the sharded path.
+        If both exist the sharded one is newer (writers only write there),
+        so the flat copy is dropped. Call with the user's write lock held.
+        """
+        path = self.user_file(user_id, kind)
+        if self.migrated():
+            return path
+        legacy = self.legacy_file(user_id, kind)
+        if os.path.exists(legacy):
+            if os.path.exists(path):
+                os.remove(legacy)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(legacy, path)
+        return path
+
+    def legacy_files(self) -> Iterator[Tuple[str, str]]:
+        """(user_id, kind) for every file still in the flat layout."""
+        for directory in sorted({d for d, _ in FILES.values()}):
+            try:
+                entries = os.scandir(os.path.join(self.root, directory))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    for suffix, kind in _SUFFIXES:
+                        if entry.name.endswith(suffix) and FILES[kind][0] == directory:
+                            yield entry.name[: -len(suffix)], kind
+                            break
+
+    def finish_if_migrated(self) -> bool:
+        """Writes the layout marker once no flat files are left (cheap: stops at the first one)."""
+        if self.migrated():
+            return True
+        for _ in self.legacy_files():
+            return False
+        atomic_write_json(self.marker, {"layout": "sharded", "levels": self.levels})
+        self._migrated = True
+        return True
+
+    def migrate(self, user_ids: Iterable[str] = ()) -> int:
+        """
+        Moves every flat file into its shard, one user at a time under
+        that user's write lock, so it is safe while the service runs.
+        Registered `user_ids` go first; anything else is found by file name.
+        Returns the number of files moved.
+        """
+        moved = 0
+
+        def claim_all(user_id: str, kinds: Iterable[str]) -> None:
+            nonlocal moved
+            with write_lock(self.lock(user_id)):
+                for kind in kinds:
+                    if os.path.exists(self.legacy_file(user_id, kind)):
+                        self.claim(user_id, kind)
+                        moved += 1
+
+        for user_id in user_ids:
+            claim_all(user_id, FILES)
+        for user_id, kind in list(self.legacy_files()):
+            claim_all(user_id, (kind,))
+
+        self.finish_if_migrated()
+        return moved
+
+
+if __name__ == "__main__":
+    # python data_paths.py migrate [--root Data]  (run from the backend directory)
+    ap = argparse.ArgumentParser(description="Move Data/ files into the sharded layout.")
+    ap.add_argument("command", choices=["migrate", "status"])
+    ap.add_argument("--root", default=None, help="Data root (default: $DATA_ROOT or Data)")
+    args = ap.parse_args()
+
+    paths = DataPaths(args.root)
+    if args.command == "status":
+        remaining = sum(1 for _ in paths.legacy_files())
+        print(json.dumps({"root": paths.root, "migrated": paths.migrated(), "flat_files": remaining}))
+    else:
+        from user_registry import UserRegistry
+
+        registry = UserRegistry(paths.shared("users.sqlite3"))
+        count = paths.migrate(row["user_id"] for row in registry.list())
+        print(f"Moved {count} files; migration {'complete' if paths.migrated() else 'incomplete'}")
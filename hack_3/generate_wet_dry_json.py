@@ -8,6 +8,13 @@ Input:
     {"date":"2026-01-10","text":"..."},
     {"date":"2026-01-12","text":"..."}
   ]
+  or NDJSON (one update object per line), or the backend's date-ordered
+  log (*.jsonl), one update per line:
+    {"Data":"...","Text_Update":"...","created_at":"2026-01-12T09:30:00Z"}
+  Files are parsed incrementally: updates are validated and sent to the
+  model as they are read, with at most --max-in-flight pending, so memory
+  stays flat on large exports (--latest-first still reads the whole file,
+  since it has to start from the newest update).
 
 Output:
   wetlab.json and drylab.json, each shaped like:
@@ -17,6 +24,27 @@ Output:
 
 Gemini:
   Calls Gemini twice per update (wet + dry) and returns plain text summaries.
+  With --dual, one call returns both as JSON ({"wet": "...", "dry": "..."});
+  if that reply can't be parsed, the update falls back to the two calls.
+  Calls run concurrently (--max-in-flight) behind a token-bucket rate limit
+  (--rate/--burst). Retryable errors (429, 5xx, timeouts) back off with
+  jitter within --deadline seconds per call; a circuit breaker fails
+  calls fast while Gemini keeps failing. With --latest-first, updates are
+  walked newest to oldest until a relevant wet and dry summary are found.
+  Summaries are cached on disk (--cache). Updates longer than
+  --chunk-tokens are condensed chunk by chunk first (map-reduce). The
+  SDK is imported on the first call (see llm_provider.py).
+
+Incremental (--state):
+  Remembers how far into the input it has read plus the current latest wet
+  and dry summaries. The next run only summarizes updates appended since
+  then and merges them into the outputs. If the log was rewritten in the
+  meantime (a historical import sorted into it, or compaction), the whole
+  log is read again; cached summaries keep that cheap.
+
+Date range (--since/--until, JSONL logs only):
+  Summarizes only the updates in that range, found through the log's date
+  index (see update_log.py) instead of reading and sorting the history.
 """
 
 #!/usr/bin/env python3
@@ -24,14 +52,32 @@ from __future__ import annotations
 
 import argparse
 import json
+import logging
 import os
+import random
+import re
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-from google import genai
-from google.genai import types
+from llm_provider import (
+    EmptyResponseError,
+    MissingApiKeyError,
+    ProviderUnavailableError,
+    TextProvider,
+    get_provider,
+)
+from metrics import REGISTRY, data_io
+from safe_io import atomic_open
+from summary_cache import SummaryCache
+from update_log import CursorExpiredError, UpdateLog
+
+# Per-update progress; main() prints INFO to stdout, the backend leaves it unconfigured
+logger = logging.getLogger(__name__)
 
 
 # ---- Prompting ----
@@ -86,129 +132,987 @@ Output Structure:
 - A single text summary, which defines all acronyms in the text and includes additional context that the dry lab scientist doesn’t inherently have. End the text with one speculative line for what this output could mean for the dry lab scientists work.
 """
 
+DUAL_SYSTEM = f"""You will write two independent translations of the same notes and return them together.
+
+For the "wet" translation, follow these instructions exactly:
+
+{WET_SYSTEM}
+
+For the "dry" translation, follow these instructions exactly:
+
+{DRY_SYSTEM}
+
+Return only a JSON object of the form {{"wet": "<wet translation>", "dry": "<dry translation>"}} with no other text.
+"""
+
 NO_WET = "No wet-lab work reported this period."
 NO_DRY = "No dry-lab work reported this period."
 
+CHUNK_SYSTEM = """You are condensing one part of a long laboratory note. The condensed parts will later be translated together into a single short summary.
+
+Strict Adherence Required:
+
+1. Zero hallucination tolerance. Only use what is written in this part.
+2. Keep every key parameter, result, sample, reagent, instrument, dataset, tool and decision.
+3. For each key parameter/claim, copy a short direct excerpt from the text (<15 words) in quotes, so it can be quoted later.
+4. Be concise. Keep to under 200 words.
+5. Do not add interpretation, sub-headings or follow-up questions.
+
+Output Structure:
 
-def parse_args() -> argparse.Namespace:
+- Plain text notes only.
+"""
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     p = argparse.ArgumentParser()
-    p.add_argument("--updates", required=True, help="Path to updates JSON (array).")
+    p.add_argument("--updates", required=True, help="Path to updates JSON (array), NDJSON or the backend JSONL log.")
     p.add_argument("--wet-out", default="wetlab.json", help="Output path for wetlab.json")
     p.add_argument("--dry-out", default="drylab.json", help="Output path for drylab.json")
     p.add_argument("--model", default="gemini-2.5-flash", help="Gemini model name")
-    p.add_argument("--retries", type=int, default=3, help="Retries per Gemini call")
-    p.add_argument("--sleep", type=float, default=0.0, help="Sleep seconds between calls")
+    p.add_argument("--retries", type=int, default=3, help="Max attempts per Gemini call (retryable errors only)")
+    p.add_argument("--deadline", type=float, default=120.0, help="Seconds per Gemini call, retries included")
+    p.add_argument("--sleep", type=float, default=0.0, help="Min seconds between calls (same as --rate 1/sleep)")
     p.add_argument("--temperature", type=float, default=0.3, help="Generation temperature")
-    return p.parse_args()
+    p.add_argument("--max-in-flight", type=int, default=4, help="Max concurrent Gemini calls")
+    p.add_argument("--rate", type=float, default=0.0, help="Max Gemini calls per second (0 = unlimited)")
+    p.add_argument("--burst", type=float, default=1.0, help="Token bucket size for --rate")
+    p.add_argument(
+        "--latest-first",
+        action="store_true",
+        help="Walk updates newest to oldest and stop once a relevant wet and dry summary exist",
+    )
+    p.add_argument("--cache", default="summary_cache.sqlite3", help="Path to the summary cache (SQLite)")
+    p.add_argument("--cache-max-mb", type=float, default=64.0, help="Max size of cached summaries in MB")
+    p.add_argument("--no-cache", action="store_true", help="Always call Gemini, bypassing the cache")
+    p.add_argument(
+        "--dual",
+        action="store_true",
+        help="One Gemini call per update returning both wet and dry as JSON (falls back to two calls)",
+    )
+    p.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=4000,
+        help="Split updates longer than this many (estimated) tokens and summarize them map-reduce (0 = never)",
+    )
+    p.add_argument("--state", default=None, help="Path to incremental state JSON (only new updates are summarized)")
+    p.add_argument("--since", default=None, help="Only updates created on/after this date (YYYY-MM-DD or ISO)")
+    p.add_argument("--until", default=None, help="Only updates created on/before this date (YYYY-MM-DD or ISO)")
+    args = p.parse_args(argv)
+    if args.max_in_flight < 1:
+        p.error("--max-in-flight must be >= 1")
+    if args.since or args.until:
+        if not args.updates.endswith(".jsonl"):
+            p.error("--since/--until need a JSONL update log")
+        if args.state:
+            p.error("--since/--until can't be combined with --state")
+    if args.rate <= 0 and args.sleep > 0:
+        args.rate = 1.0 / args.sleep
+    return args
 
 def load_json(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
+    with data_io("read", path), open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def open_log(
+    log: UpdateLog,
+    state: Dict[str, Any],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    (record, end_offset) pairs of the date-ordered log from the saved
+    state["offset"] (optionally only since..until). If the log was
+    rewritten since that offset was saved (state["epoch"] differs), it
+    no longer lines up and the read starts over from 0.
+    """
+    try:
+        epoch, records = log.query(state["offset"], since=since, until=until, epoch=state.get("epoch", ""))
+    except CursorExpiredError:
+        state["offset"] = 0
+        epoch, records = log.query(0, since=since, until=until)
+    state["epoch"] = epoch
+    return records
+
+
+def load_log(
+    log: UpdateLog,
+    records: Iterator[Tuple[Dict[str, Any], int]],
+    offset: int,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Reads the open_log() pairs into memory. Returns (records, end_offset);
+    a trailing line without "\n" (append in flight) is left for next time.
+    """
+    loaded: List[Dict[str, Any]] = []
+    # The log's reads are timed by UpdateLog itself
+    for record, end in records:
+        loaded.append(record)
+        offset = end
+    return loaded, offset
+
 def save_json(path: str, data: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
+    # temp file + fsync + rename: readers never see a half-written file
+    with atomic_open(path) as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+# What may follow a complete array element or NDJSON value
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def _read_chunks(f: IO[str], path: str, size: int) -> Iterator[str]:
+    while True:
+        with data_io("read", path):
+            chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_json_values(f: IO[str], path: str = "", chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yields the elements of a top-level JSON array, or the values of an
+    NDJSON file, one at a time. Only the current element (plus one chunk)
+    is held in memory. Raises ValueError on malformed input.
+    """
+    chunks = _read_chunks(f, path, chunk_size)
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        # Appends one more chunk; False at end of file
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    def skip_ws() -> Optional[str]:
+        # Next non-whitespace character (not consumed), None at end of file
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return None
+
+    def value() -> Any:
+        nonlocal pos
+        while True:
+            try:
+                item, end = _DECODER.raw_decode(buf, pos)
+            except ValueError:
+                if not fill():
+                    raise ValueError("Invalid or truncated JSON in the updates file")
+                continue
+            # Only trust the value once a delimiter follows it: cut at a chunk
+            # boundary, "0." of "0.1" or "tr" of "true" can still be mid-token
+            if (end == len(buf) or buf[end] not in _DELIMITERS) and not eof and fill():
+                continue
+            pos = end
+            return item
+
+    first = skip_ws()
+    if first is None:
+        return
+    if first != "[":
+        # NDJSON: whitespace-separated values
+        while skip_ws() is not None:
+            yield value()
+        return
+
+    pos += 1
+    if skip_ws() == "]":
+        return
+    while True:
+        yield value()
+        sep = skip_ws()
+        pos += 1
+        if sep == "]":
+            if skip_ws() is not None:
+                raise ValueError("Unexpected data after the JSON array")
+            return
+        if sep != ",":
+            raise ValueError("Expected ',' or ']' between array elements")
+        skip_ws()
+
+
+def require_update(u: Any, i: int) -> Dict[str, Any]:
+    if not isinstance(u, dict):
+        raise ValueError(f"Update at index {i} is not a JSON object")
+    if "Text_Update" in u and "text" not in u:
+        # Backend update shape; date comes from the server-side timestamp
+        u = {"date": str(u.get("created_at", ""))[:10], "text": u["Text_Update"]}
+    if "date" not in u or "text" not in u:
+        raise ValueError(f"Update at index {i} missing required keys: date, text")
+    return u
+
+
 def require_updates(payload: Any) -> List[Dict[str, Any]]:
     if not isinstance(payload, list) or not all(isinstance(x, dict) for x in payload):
         raise ValueError("updates.json must be a JSON array of objects.")
-    for i, u in enumerate(payload):
-        if "date" not in u or "text" not in u:
-            raise ValueError(f"Update at index {i} missing required keys: date, text")
-    return payload
+    return [require_update(u, i) for i, u in enumerate(payload)]
+
+
+def iter_updates(path: str, start: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Validated updates from a JSON array or NDJSON file, one at a time,
+    skipping the first `start` (already processed by an earlier run).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for i, u in enumerate(iter_json_values(f, path)):
+            if i >= start:
+                yield require_update(u, i)
 
 def parse_date_yyyy_mm_dd(s: str) -> datetime:
     return datetime.strptime(s, "%Y-%m-%d")
 
+def _date_key(u: Dict[str, Any]) -> datetime:
+    # Undated (legacy) updates sort first, keeping their input order
+    date = str(u["date"])
+    return parse_date_yyyy_mm_dd(date) if date else datetime.min
+
+def load_state(path: str) -> Dict[str, Any]:
+    try:
+        state = load_json(path)
+    except FileNotFoundError:
+        state = {}
+    if not isinstance(state, dict):
+        state = {}
+    return {
+        "position": int(state.get("position", 0)),
+        "offset": int(state.get("offset", 0)),
+        "epoch": state.get("epoch"),
+        "wet": state.get("wet"),
+        "dry": state.get("dry"),
+    }
+
+def merge_latest(
+    current: Optional[Dict[str, Any]],
+    found: Optional[Tuple[Dict[str, Any], str]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Combines the stored latest summary with the newest relevant one from
+    this run; the later date wins (ties go to the new summary).
+    """
+    if found is None:
+        return current
+    candidate = {"date": found[0]["date"], "summary": found[1]}
+    if current is None or str(candidate["date"]) >= str(current.get("date", "")):
+        return candidate
+    return current
+
+
+# ---- Chunking (map-reduce for long updates) ----
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+# Condense rounds before giving up on getting the notes under the threshold
+MAX_CHUNK_ROUNDS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; an exact count would cost an API call
+    return (len(text) + 3) // 4
+
+
+def _pieces(text: str, max_tokens: int) -> Iterator[Tuple[str, str]]:
+    """
+    (piece, separator) pairs, each piece within max_tokens: paragraphs,
+    then sentences of oversized paragraphs, then whitespace-separated runs
+    of oversized sentences (e.g. a pasted table).
+    """
+    max_chars = max_tokens * 4
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            yield paragraph, "\n\n"
+            continue
+        separator = "\n\n"
+        for sentence in _SENTENCE_BREAK.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                yield sentence[:cut], separator
+                sentence = sentence[cut:].lstrip()
+                separator = " "
+            if sentence:
+                yield sentence, separator
+            separator = " "
+
+
+def split_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Splits `text` into chunks of at most ~max_tokens, preferring paragraph,
+    then sentence boundaries. Chunks come out about the same size (a text
+    just over the limit becomes two halves, not a full chunk and a sliver).
+    """
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return [text]
+    count = -(-total // max_tokens)
+    target = -(-total // count)
+
+    chunks: List[str] = []
+    current = ""
+    for piece, separator in _pieces(text, max_tokens):
+        candidate = current + separator + piece if current else piece
+        if current and (estimate_tokens(current) >= target or estimate_tokens(candidate) > max_tokens):
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TokenBucket:
+    """
+    Blocking rate limiter shared by all worker threads:
+    `rate` calls per second, with bursts of up to `capacity` calls.
+    A rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class UpstreamUnavailableError(RuntimeError):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Shared by every call of a summarizer. After `threshold` consecutive
+    retryable failures the circuit opens and calls fail fast with
+    UpstreamUnavailableError for `cooldown` seconds. Then a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again. A threshold <= 0 disables the breaker.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            retry_in = self._opened_at + self.cooldown - time.monotonic()
+            if retry_in > 0 or self._probing:
+                raise UpstreamUnavailableError(
+                    f"Gemini is unavailable after {self._failures} consecutive failures; "
+                    f"not calling it for another {max(retry_in, 0.0):.0f}s"
+                )
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.threshold > 0 and (self._probing or self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._opened_at is None:
+                state, retry_in = "closed", 0.0
+            else:
+                retry_in = max(0.0, self._opened_at + self.cooldown - time.monotonic())
+                state = "open" if retry_in > 0 or not self._probing else "half_open"
+            return {"state": state, "consecutive_failures": self._failures, "retry_in": round(retry_in, 1)}
+
+
+# ---- Metrics (served by the backend's GET /metrics) ----
+
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_duration_seconds",
+    "gemini_text calls, retries and backoff included (outcome: ok, failed, fatal, rejected)",
+    ("model", "outcome"),
+)
+LLM_ATTEMPT_SECONDS = REGISTRY.histogram(
+    "llm_attempt_duration_seconds",
+    "Individual generate_content requests",
+    ("model", "outcome"),
+)
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "generate_content requests after the first", ("model",))
+LLM_FAILURES = REGISTRY.counter("llm_failures_total", "gemini_text calls that ran out of retries", ("model",))
+LLM_CHUNKS = REGISTRY.counter("llm_chunks_total", "Chunks long updates were split into before summarizing", ("model",))
+
 def gemini_text(
-    client: genai.Client,
+    provider: TextProvider,
     model: str,
     system_instruction: str,
     text_update: str,
     temperature: float,
     retries: int,
+    response_mime_type: Optional[str] = None,
+    deadline: Optional[float] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    backoff_base: float = 1.0,
+    backoff_cap: float = 20.0,
+    limiter: Optional[TokenBucket] = None,
 ) -> str:
+    """
+    One model call, with up to `retries` attempts. Errors the provider
+    classifies as permanent (bad request, bad key) are raised at once.
+    Retryable ones wait a full-jitter exponential backoff, or the server's
+    retry-after hint if that is longer, as long as the next attempt still
+    fits in `deadline` seconds from the start of the call. With a
+    `breaker`, UpstreamUnavailableError is raised instead of calling the
+    model while the upstream is considered down. Every attempt, retries
+    included, takes a `limiter` token before asking the breaker.
+    """
     prompt = f'text:\n"""{text_update}"""'
     last_err: Optional[Exception] = None
+    call_start = time.perf_counter()
+    give_up_at = call_start + deadline if deadline else None
+
+    def fail(outcome: str) -> None:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - call_start, model, outcome)
 
-    for attempt in range(1, retries + 1):
+    attempt = 0
+    while attempt < retries:
+        attempt += 1
+        if limiter is not None:
+            limiter.acquire()
+        timeout = None if give_up_at is None else give_up_at - time.perf_counter()
+        if timeout is not None and timeout <= 0:
+            last_err = last_err or TimeoutError("deadline passed waiting for the rate limiter")
+            break
+        # Asked last: in half-open state allow() claims the single trial call,
+        # which only record_success()/record_failure() below give back
+        if breaker is not None:
+            try:
+                breaker.allow()
+            except UpstreamUnavailableError:
+                fail("rejected")
+                raise
+        if attempt > 1:
+            LLM_RETRIES.inc(model)
+        attempt_start = time.perf_counter()
         try:
-            resp = client.models.generate_content(
-                model=model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=temperature,
-                ),
-            )
-            out = (resp.text or "").strip()
+            out = provider.generate(
+                model,
+                system_instruction,
+                prompt,
+                temperature,
+                response_mime_type=response_mime_type,
+                timeout=timeout,
+            ).strip()
             if not out:
-                raise RuntimeError("Empty response from Gemini.")
-            return out
+                raise EmptyResponseError("Empty response from Gemini.")
         except Exception as e:
+            LLM_ATTEMPT_SECONDS.observe(time.perf_counter() - attempt_start, model, "error")
+            retryable, hint = provider.classify(e)
+            if not retryable:
+                if breaker is not None:
+                    # The upstream answered (or never got asked): not an outage
+                    breaker.record_success()
+                fail("fatal")
+                raise
+            if breaker is not None:
+                breaker.record_failure()
             last_err = e
-            time.sleep(min(2.0 * attempt, 6.0))
+            if attempt == retries:
+                break
+            delay = random.uniform(0.0, min(backoff_cap, backoff_base * 2 ** (attempt - 1)))
+            if hint is not None:
+                delay = max(delay, hint)
+            if give_up_at is not None and time.perf_counter() + delay >= give_up_at:
+                break
+            time.sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        now = time.perf_counter()
+        LLM_ATTEMPT_SECONDS.observe(now - attempt_start, model, "ok")
+        LLM_CALL_SECONDS.observe(now - call_start, model, "ok")
+        return out
 
-    raise RuntimeError(f"Gemini call failed after {retries} retries: {last_err}")
+    fail("failed")
+    LLM_FAILURES.inc(model)
+    waited = time.perf_counter() - call_start
+    raise RuntimeError(f"Gemini call failed after {attempt} attempt(s) in {waited:.1f}s: {last_err}")
 
 def pick_latest_relevant(
     updates_sorted: List[Dict[str, Any]],
-    summaries: List[str],
+    summaries: List[Optional[str]],
     sentinel: str,
 ) -> Optional[Tuple[Dict[str, Any], str]]:
+    # None = never summarized (skipped by --latest-first)
     for u, s in zip(reversed(updates_sorted), reversed(summaries)):
-        if s.strip() != sentinel:
+        if s is not None and s.strip() != sentinel:
             return (u, s.strip())
     return None
 
-def main() -> int:
-    args = parse_args()
+def _is_relevant(summary: Optional[str], sentinel: str) -> bool:
+    return summary is not None and summary.strip() != sentinel
 
-    api_key = os.environ.get("gem_key")
-    if not api_key:
-        print("ERROR: GEMINI_API_KEY is not set.", file=sys.stderr)
-        return 2
+def parse_dual(raw: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Validates a DUAL_SYSTEM reply; returns (wet, dry) or None if it is not
+    a JSON object with two non-empty strings.
+    """
+    if not raw:
+        return None
+    text = raw.strip()
+    if text.startswith("```"):
+        # Tolerate a fenced ```json ... ``` block
+        text = text.strip("`")
+        if text.startswith("json"):
+            text = text[len("json"):]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    wet, dry = data.get("wet"), data.get("dry")
+    if not isinstance(wet, str) or not wet.strip() or not isinstance(dry, str) or not dry.strip():
+        return None
+    return wet.strip(), dry.strip()
+
+
+class WetDrySummarizer:
+    """
+    Reusable wet/dry summarization engine.
+
+    Create once (e.g. at app startup) and share: the provider, worker pool,
+    rate limiter and cache live as long as the summarizer, so callers only
+    pay for the model calls themselves. Without an explicit `provider` a
+    GeminiProvider is built on first use.
+
+      summarizer = WetDrySummarizer(api_key=os.environ.get("gem_key"))
+      wet, dry = summarizer.latest([{"date": "2026-01-12", "text": "..."}])
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        provider: Optional[TextProvider] = None,
+        model: str = "gemini-2.5-flash",
+        temperature: float = 0.3,
+        retries: int = 3,
+        max_in_flight: int = 4,
+        rate: float = 0.0,
+        burst: float = 1.0,
+        latest_first: bool = False,
+        cache: Optional[SummaryCache] = None,
+        dual: bool = False,
+        chunk_tokens: int = 4000,
+        deadline: float = 120.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.retries = retries
+        self.max_in_flight = max_in_flight
+        self.latest_first = latest_first
+        self.cache = cache
+        self.dual = dual
+        # Updates estimated above this many tokens are summarized map-reduce (0 = never)
+        self.chunk_tokens = chunk_tokens
+        # Seconds per model call, retries included; the breaker is shared by all calls
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self._provider = provider
+        self._provider_lock = threading.Lock()
+        self._limiter = TokenBucket(rate, burst)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini")
+        # Chunk calls are issued from inside _pool's workers, so they need their own threads
+        self._chunk_pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini-chunk")
+        # Long texts being condensed right now, so wet and dry calls share one map step
+        self._condensing: Dict[str, Future] = {}
+        self._condensing_lock = threading.Lock()
 
-    client = genai.Client(api_key=api_key)
+    @property
+    def provider(self) -> TextProvider:
+        with self._provider_lock:
+            if self._provider is None:
+                if not self.api_key:
+                    raise MissingApiKeyError("Gemini API key (gem_key) is not set.")
+                self._provider = get_provider("gemini", api_key=self.api_key)
+            return self._provider
 
-    updates = require_updates(load_json(args.updates))
-    updates_sorted = sorted(updates, key=lambda u: parse_date_yyyy_mm_dd(str(u["date"])))
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._chunk_pool.shutdown(wait=True, cancel_futures=True)
+        if self._provider is not None:
+            self._provider.close()
 
-    wet_summaries: List[str] = []
-    dry_summaries: List[str] = []
+    def _condense(self, text: str) -> str:
+        """
+        Map step for updates longer than chunk_tokens: the chunks are
+        condensed to quoted key facts in parallel and the joined notes
+        stand in for the text in the final (reduce) call. Repeats while the
+        notes are still over the threshold. Shorter texts come back as is.
+        """
+        if self.chunk_tokens <= 0 or estimate_tokens(text) <= self.chunk_tokens:
+            return text
+        with self._condensing_lock:
+            future = self._condensing.get(text)
+            owner = future is None
+            if owner:
+                future = self._condensing[text] = Future()
+        if not owner:
+            return future.result()
 
-    for i, u in enumerate(updates_sorted, start=1):
+        try:
+            notes = text
+            for _ in range(MAX_CHUNK_ROUNDS):
+                if estimate_tokens(notes) <= self.chunk_tokens:
+                    break
+                chunks = split_text(notes, self.chunk_tokens)
+                LLM_CHUNKS.inc(self.model, amount=len(chunks))
+                # Each chunk is at most chunk_tokens, so this doesn't recurse
+                parts = list(self._chunk_pool.map(lambda c: self._summarize_one(CHUNK_SYSTEM, {"text": c}), chunks))
+                notes = "\n\n".join(f"Part {i} of {len(parts)}:\n{part}" for i, part in enumerate(parts, 1))
+            future.set_result(notes)
+            return notes
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._condensing_lock:
+                self._condensing.pop(text, None)
+
+    def _summarize_one(self, system_instruction: str, u: Dict[str, Any]) -> str:
         text_update = str(u.get("text", "")).strip()
+        key = SummaryCache.make_key(self.model, system_instruction, self.temperature, text_update)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        prompt_text = self._condense(text_update)
+        provider = self.provider
+        out = gemini_text(
+            provider,
+            self.model,
+            system_instruction,
+            prompt_text,
+            self.temperature,
+            self.retries,
+            deadline=self.deadline,
+            breaker=self.breaker,
+            limiter=self._limiter,
+        )
+        if self.cache is not None:
+            self.cache.put(key, out)
+        return out
 
-        wet = gemini_text(client, args.model, WET_SYSTEM, text_update, args.temperature, args.retries)
-        if args.sleep > 0:
-            time.sleep(args.sleep)
+    def _summarize_pair(self, u: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Wet and dry summaries from one DUAL_SYSTEM call. Falls back to the
+        two single-audience calls if the reply is not valid JSON.
+        """
+        text_update = str(u.get("text", "")).strip()
+        key = SummaryCache.make_key(self.model, DUAL_SYSTEM, self.temperature, text_update)
+        if self.cache is not None:
+            parsed = parse_dual(self.cache.get(key))
+            if parsed is not None:
+                return parsed
 
-        dry = gemini_text(client, args.model, DRY_SYSTEM, text_update, args.temperature, args.retries)
-        if args.sleep > 0:
-            time.sleep(args.sleep)
+        prompt_text = self._condense(text_update)
+        provider = self.provider
+        raw = gemini_text(
+            provider,
+            self.model,
+            DUAL_SYSTEM,
+            prompt_text,
+            self.temperature,
+            self.retries,
+            response_mime_type="application/json",
+            deadline=self.deadline,
+            breaker=self.breaker,
+            limiter=self._limiter,
+        )
+        parsed = parse_dual(raw)
+        if parsed is None:
+            logger.warning("Dual summary reply was not valid JSON; falling back to two calls.")
+            return self._summarize_one(WET_SYSTEM, u), self._summarize_one(DRY_SYSTEM, u)
+        if self.cache is not None:
+            self.cache.put(key, raw)
+        return parsed
 
-        wet_summaries.append(wet)
-        dry_summaries.append(dry)
+    def _submit(self, u: Dict[str, Any], want_wet: bool, want_dry: bool) -> List[Tuple[str, Future]]:
+        calls: List[Tuple[str, Future]] = []
+        if want_wet and want_dry and self.dual:
+            calls.append(("pair", self._pool.submit(self._summarize_pair, u)))
+        else:
+            if want_wet:
+                calls.append(("wet", self._pool.submit(self._summarize_one, WET_SYSTEM, u)))
+            if want_dry:
+                calls.append(("dry", self._pool.submit(self._summarize_one, DRY_SYSTEM, u)))
+        return calls
 
-        print(f"[{i}/{len(updates_sorted)}] {u['date']}")
+    @staticmethod
+    def _collect(calls: List[Tuple[str, Future]]) -> Tuple[Optional[str], Optional[str]]:
+        wet: Optional[str] = None
+        dry: Optional[str] = None
+        for kind, future in calls:
+            if kind == "pair":
+                wet, dry = future.result()
+            elif kind == "wet":
+                wet = future.result()
+            else:
+                dry = future.result()
+        return wet, dry
 
-    latest_wet = pick_latest_relevant(updates_sorted, wet_summaries, NO_WET)
-    latest_dry = pick_latest_relevant(updates_sorted, dry_summaries, NO_DRY)
+    def summarize(
+        self, updates_sorted: List[Dict[str, Any]]
+    ) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+        """
+        Returns (wet_summaries, dry_summaries) aligned with updates_sorted.
+        Entries are None for updates that latest-first mode never needed.
+        Cache hits skip both the rate limiter and the network call.
+        """
+        total = len(updates_sorted)
+        wet_summaries: List[Optional[str]] = [None] * total
+        dry_summaries: List[Optional[str]] = [None] * total
+        submitted: List[Future] = []
 
-    wet_out: Dict[str, Any] = {
-        "latest": {"date": "", "summary": NO_WET}
-        if latest_wet is None
-        else {"date": latest_wet[0]["date"], "summary": latest_wet[1]}
-    }
-    dry_out: Dict[str, Any] = {
-        "latest": {"date": "", "summary": NO_DRY}
-        if latest_dry is None
-        else {"date": latest_dry[0]["date"], "summary": latest_dry[1]}
-    }
+        def submit(i: int, want_wet: bool, want_dry: bool) -> List[Tuple[str, Future]]:
+            calls = self._submit(updates_sorted[i], want_wet, want_dry)
+            submitted.extend(future for _, future in calls)
+            return calls
 
-    save_json(args.wet_out, wet_out)
-    save_json(args.dry_out, dry_out)
+        def collect(i: int, calls: List[Tuple[str, Future]]) -> None:
+            wet_summaries[i], dry_summaries[i] = self._collect(calls)
+
+        try:
+            if not self.latest_first:
+                pending = [submit(i, True, True) for i in range(total)]
+                for i, calls in enumerate(pending):
+                    collect(i, calls)
+                    logger.info("[%d/%d] %s", i + 1, total, updates_sorted[i]["date"])
+                return wet_summaries, dry_summaries
+
+            # Newest to oldest, one window of calls at a time, until both found.
+            need_wet = need_dry = True
+            idx = total - 1
+            while idx >= 0 and (need_wet or need_dry):
+                calls_per_update = 1 if (self.dual or not (need_wet and need_dry)) else 2
+                window = max(1, self.max_in_flight // calls_per_update)
+                batch = list(range(idx, max(-1, idx - window), -1))
+
+                pending_batch = [(i, submit(i, need_wet, need_dry)) for i in batch]
+                for i, calls in pending_batch:
+                    collect(i, calls)
+
+                for i in batch:
+                    logger.info("[%d/%d] %s", total - i, total, updates_sorted[i]["date"])
+                    need_wet = need_wet and not _is_relevant(wet_summaries[i], NO_WET)
+                    need_dry = need_dry and not _is_relevant(dry_summaries[i], NO_DRY)
+                idx -= len(batch)
+            return wet_summaries, dry_summaries
+        finally:
+            # On error, drop our queued calls instead of spending API budget on them.
+            for future in submitted:
+                future.cancel()
+
+    def latest(
+        self, updates: List[Dict[str, Any]], presorted: bool = False
+    ) -> Tuple[Optional[Tuple[Dict[str, Any], str]], Optional[Tuple[Dict[str, Any], str]]]:
+        """
+        Summarizes in-memory updates ({"date", "text"} or the backend's
+        {"Text_Update", "created_at"} shape) and returns the newest relevant
+        (update, summary) pair for wet and for dry, or None.
+        `presorted` skips parsing and sorting dates (input read from an UpdateLog).
+        """
+        updates_sorted = require_updates(updates)
+        if not presorted:
+            updates_sorted = sorted(updates_sorted, key=_date_key)
+        wet_summaries, dry_summaries = self.summarize(updates_sorted)
+        return (
+            pick_latest_relevant(updates_sorted, wet_summaries, NO_WET),
+            pick_latest_relevant(updates_sorted, dry_summaries, NO_DRY),
+        )
+
+    def latest_stream(
+        self, updates: Iterable[Dict[str, Any]]
+    ) -> Tuple[Optional[Tuple[Dict[str, Any], str]], Optional[Tuple[Dict[str, Any], str]]]:
+        """
+        latest() for validated updates arriving one at a time, in any order.
+        Each update is submitted as soon as it is read, with at most
+        max_in_flight updates pending, so memory stays flat and the first
+        calls start before the input is fully read. Ties on date go to the
+        update that came later, as in latest().
+        """
+        best: Dict[str, Optional[Tuple[datetime, Dict[str, Any], str]]] = {"wet": None, "dry": None}
+        pending: Deque[Tuple[Dict[str, Any], List[Tuple[str, Future]]]] = deque()
+        seen = 0
+
+        def settle() -> None:
+            u, calls = pending.popleft()
+            key = _date_key(u)
+            for audience, summary, sentinel in zip(("wet", "dry"), self._collect(calls), (NO_WET, NO_DRY)):
+                current = best[audience]
+                if _is_relevant(summary, sentinel) and (current is None or key >= current[0]):
+                    best[audience] = (key, u, summary.strip())
+            logger.info("[%d] %s", seen - len(pending), u["date"])
+
+        try:
+            for u in updates:
+                seen += 1
+                pending.append((u, self._submit(u, True, True)))
+                if len(pending) >= self.max_in_flight:
+                    settle()
+            while pending:
+                settle()
+        finally:
+            # On error, drop our queued calls instead of spending API budget on them.
+            for _, calls in pending:
+                for _, future in calls:
+                    future.cancel()
+
+        def found(audience: str) -> Optional[Tuple[Dict[str, Any], str]]:
+            entry = best[audience]
+            return None if entry is None else (entry[1], entry[2])
+
+        return found("wet"), found("dry")
+
+    def recompute(
+        self,
+        updates: Union[str, UpdateLog],
+        wet_out: str,
+        dry_out: str,
+        state_path: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Summarizes updates appended to `updates` (a JSON array file, a
+        JSONL log path or an UpdateLog) since the saved state, merges them
+        into the latest wet/dry summaries and writes both outputs.
+        Without `state_path` the whole input is processed; since/until
+        restrict a log to that date range. Returns the new state.
+        """
+        state = load_state(state_path) if state_path else {"position": 0, "offset": 0, "wet": None, "dry": None}
+        updates_path = updates.path if isinstance(updates, UpdateLog) else updates
+        log: Optional[UpdateLog] = None
+        if updates_path.endswith(".jsonl"):
+            log = updates if isinstance(updates, UpdateLog) else UpdateLog(updates_path)
+            # Resets state["offset"] if the log was rewritten since the last run
+            records = open_log(log, state, since, until)
+        progress = (state["offset"], state["position"])
+
+        if log is not None:
+            # Only the bytes appended since the last run (or the date range) are read
+            if self.latest_first:
+                # Newest first: the (already date-ordered) batch has to be in hand
+                raw, state["offset"] = load_log(log, records, state["offset"])
+                latest_wet, latest_dry = self.latest(raw, presorted=True) if raw else (None, None)
+            else:
+
+                def from_log() -> Iterator[Dict[str, Any]]:
+                    for i, (record, end) in enumerate(records):
+                        state["offset"] = end
+                        yield require_update(record, i)
+
+                latest_wet, latest_dry = self.latest_stream(from_log())
+        elif self.latest_first:
+            raw = load_json(updates_path)
+            if not isinstance(raw, list):
+                raise ValueError("updates.json must be a JSON array of objects.")
+            raw, state["position"] = raw[state["position"]:], len(raw)
+            latest_wet, latest_dry = self.latest(raw) if raw else (None, None)
+        else:
+
+            def from_file() -> Iterator[Dict[str, Any]]:
+                for u in iter_updates(updates_path, state["position"]):
+                    state["position"] += 1
+                    yield u
+
+            latest_wet, latest_dry = self.latest_stream(from_file())
+
+        if (state["offset"], state["position"]) != progress:
+            state["wet"] = merge_latest(state["wet"], latest_wet)
+            state["dry"] = merge_latest(state["dry"], latest_dry)
+        else:
+            logger.info("No new updates.")
+
+        save_json(wet_out, {"latest": state["wet"] or {"date": "", "summary": NO_WET}})
+        save_json(dry_out, {"latest": state["dry"] or {"date": "", "summary": NO_DRY}})
+        if state_path:
+            save_json(state_path, state)
+        return state
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    cache = None if args.no_cache else SummaryCache(args.cache, int(args.cache_max_mb * 1024 * 1024))
+    summarizer = WetDrySummarizer(
+        api_key=os.environ.get("gem_key"),
+        model=args.model,
+        temperature=args.temperature,
+        retries=args.retries,
+        deadline=args.deadline,
+        max_in_flight=args.max_in_flight,
+        rate=args.rate,
+        burst=args.burst,
+        latest_first=args.latest_first,
+        cache=cache,
+        dual=args.dual,
+        chunk_tokens=args.chunk_tokens,
+    )
+    try:
+        summarizer.recompute(args.updates, args.wet_out, args.dry_out, args.state, args.since, args.until)
+    except MissingApiKeyError:
+        print("ERROR: GEMINI_API_KEY is not set.", file=sys.stderr)
+        return 2
+    except ProviderUnavailableError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    except UpstreamUnavailableError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 3
+    finally:
+        summarizer.close()
+        if cache is not None:
+            print(f"Summary cache: {cache.hits} hits, {cache.misses} misses")
+            cache.close()
 
     print(f"Wrote: {args.wet_out}")
     print(f"Wrote: {args.dry_out}")
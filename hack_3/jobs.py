@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = "job_id, user_id, status, error, created_at, started_at, finished_at"
+
+
+class Job:
+    def __init__(self, job_id: str, user_id: str):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.status = "queued"  # queued | running | done | failed
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...]) -> "Job":
+        job = cls(row[0], row[1])
+        job.status, job.error, job.created_at, job.started_at, job.finished_at = row[2:]
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _alive(pid: int) -> bool:
+    if os.name != "posix":
+        # No cheap liveness probe (os.kill would terminate the process)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_owner: Tuple[int, str] = (0, "")
+
+
+def _owner_token() -> str:
+    # One token per process, made afresh in a forked child
+    global _owner
+    if _owner[0] != os.getpid():
+        _owner = (os.getpid(), uuid.uuid4().hex)
+    return _owner[1]
+
+
+class JobQueue:
+    """
+    Background queue for per-user recompute work, shared by every worker
+    process through one SQLite table (WAL), so a job can be polled from
+    any gunicorn worker.
+
+    - At most one job per user runs at a time, across processes.
+    - Submissions for a user that already has a queued (not yet started)
+      job are coalesced into that job, so a burst of updates triggers one
+      recompute. A submission while a job is running queues exactly one
+      follow-up, which will see every update written so far.
+    - Each process runs `workers` threads that claim queued jobs and call
+      run(user_id). Local submissions wake them at once; jobs queued by
+      another process are picked up within `poll_interval` seconds.
+    - A job left "running" by a process that died is marked failed, so
+      it doesn't block that user's recomputes forever. Each process
+      registers a fresh owner token for its pid when its queue starts,
+      so a job left by an earlier process whose pid was reused is
+      caught too.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        run: Callable[[str], Any],
+        workers: int = 2,
+        max_history: int = 1000,
+        poll_interval: float = 1.0,
+    ):
+        self.path = path
+        self.run = run
+        self.max_history = max_history
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._token = _owner_token()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Autocommit; every read-modify-write below takes BEGIN IMMEDIATE itself
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner INTEGER,
+                owner_token TEXT
+            )
+            """
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "owner_token" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_token TEXT")
+        # The current token of every pid that has run a queue
+        self._conn.execute("CREATE TABLE IF NOT EXISTS owners (pid INTEGER PRIMARY KEY, token TEXT NOT NULL)")
+        self._conn.execute("INSERT OR REPLACE INTO owners (pid, token) VALUES (?, ?)", (os.getpid(), self._token))
+        # The coalescing rules, enforced for every process
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_queued ON jobs (user_id) WHERE status = 'queued'")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_running ON jobs (user_id) WHERE status = 'running'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def submit(self, user_id: str) -> Job:
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE user_id = ? AND status = 'queued'", (user_id,)
+            ).fetchone()
+            if row is not None:
+                return Job.from_row(row)
+
+            job = Job(uuid.uuid4().hex, user_id)
+            conn.execute(
+                "INSERT INTO jobs (job_id, user_id, status, created_at) VALUES (?, ?, ?, ?)",
+                (job.job_id, user_id, job.status, job.created_at),
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return None if row is None else Job.from_row(row)
+
+    def _claim(self) -> Optional[Job]:
+        with self._transaction() as conn:
+            self._reap(conn)
+            row = conn.execute(
+                f"""
+                SELECT {_COLUMNS} FROM jobs
+                WHERE status = 'queued'
+                  AND user_id NOT IN (SELECT user_id FROM jobs WHERE status = 'running')
+                ORDER BY created_at
+                LIMIT 1
+                """
+            ).fetchone()
+            if row is None:
+                return None
+            job = Job.from_row(row)
+            job.status = "running"
+            job.started_at = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, owner_token = ? WHERE job_id = ?",
+                (job.status, job.started_at, os.getpid(), self._token, job.job_id),
+            )
+            return job
+
+    @staticmethod
+    def _reap(conn: sqlite3.Connection) -> None:
+        # Fail jobs whose worker process is gone (crash, OOM kill, deploy),
+        # including ones whose pid now belongs to a newer queue
+        rows = conn.execute(
+            """
+            SELECT job_id, owner, owner_token IS NOT token AND token IS NOT NULL
+            FROM jobs LEFT JOIN owners ON owners.pid = jobs.owner
+            WHERE status = 'running'
+            """
+        ).fetchall()
+        for job_id, owner, superseded in rows:
+            if owner is not None and (superseded or not _alive(owner)):
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+                    ("worker process exited", time.time(), job_id),
+                )
+
+    def _finish(self, job: Job) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (job.status, job.error, job.finished_at, job.job_id),
+            )
+            # Forget the oldest finished jobs; queued/running ones are kept.
+            conn.execute(
+                """
+                DELETE FROM jobs WHERE job_id IN (
+                    SELECT job_id FROM jobs WHERE status IN ('done', 'failed')
+                    ORDER BY finished_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_history,),
+            )
+        # A follow-up for this user may be claimable now
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            try:
+                self.run(job.user_id)
+                job.status = "done"
+            except (Exception, SystemExit) as e:
+                # SystemExit too: a CLI-style entry point must not kill the worker
+                job.status = "failed"
+                job.error = str(e) or e.__class__.__name__
+            finally:
+                job.finished_at = time.time()
+                # Until recorded, the job holds this user's running slot;
+                # keep trying rather than let the error end the thread
+                while True:
+                    try:
+                        self._finish(job)
+                        break
+                    except sqlite3.Error:
+                        logger.exception("Could not record job %s as %s; retrying", job.job_id, job.status)
+                        time.sleep(self.poll_interval)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# HTTP statuses worth retrying: timeouts, rate limits and upstream failures
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class MissingApiKeyError(RuntimeError):
+    pass
+
+
+class ProviderUnavailableError(RuntimeError):
+    """The provider's SDK is not installed."""
+
+
+class EmptyResponseError(RuntimeError):
+    """The model answered with no text (retryable)."""
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK error (google-genai APIError.code, or an HTTP response)."""
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    value = getattr(getattr(error, "response", None), "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Seconds the server asked us to wait: a Retry-After header (seconds or
+    HTTP date) or a google.rpc.RetryInfo "retryDelay" ("12s") in the
+    error details. None if there is no hint.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        inner = details.get("error", details)
+        details = inner.get("details") if isinstance(inner, dict) else None
+    for item in details if isinstance(details, list) else ():
+        if isinstance(item, dict) and str(item.get("@type", "")).endswith("RetryInfo"):
+            try:
+                return max(0.0, float(str(item.get("retryDelay", "")).rstrip("s")))
+            except ValueError:
+                return None
+    return None
+
+
+class TextProvider:
+    """
+    One text-generation backend for the summarizer:
+      provider.generate(model, system_instruction, prompt, temperature) -> str
+    Implementations import their SDK on first use, so building one (and
+    importing this module) costs nothing until a summary is requested.
+    `timeout` (seconds) bounds a single request where the SDK supports it.
+    """
+
+    name = "base"
+
+    def generate(
+        self,
+        model: str,
+        system_instruction: str,
+        prompt: str,
+        temperature: float,
+        response_mime_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        raise NotImplementedError
+
+    def classify(self, error: BaseException) -> Tuple[bool, Optional[float]]:
+        """
+        (retryable, server-suggested delay) for an error from generate().
+        Rate limits, timeouts, 5xx, dropped connections and empty replies
+        are retryable; bad requests, auth errors and local problems are not.
+        """
+        if isinstance(error, EmptyResponseError):
+            return True, None
+        if isinstance(error, (MissingApiKeyError, ProviderUnavailableError)):
+            return False, None
+        status = error_status(error)
+        if status is not None:
+            return status in RETRYABLE_STATUSES, retry_after(error)
+        return isinstance(error, (ConnectionError, TimeoutError)), None
+
+    def close(self) -> None:
+        pass
+
+
+class GeminiProvider(TextProvider):
+    """google-genai, imported and connected on the first generate() call."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, client: Any = None):
+        self.api_key = api_key
+        self._client = client
+        self._types: Any = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Any:
+        with self._lock:
+            if self._types is None:
+                try:
+                    from google import genai
+                    from google.genai import types
+                except ImportError as e:
+                    raise ProviderUnavailableError(
+                        "google-genai is not installed (pip install google-genai)."
+                    ) from e
+                if self._client is None:
+                    if not self.api_key:
+                        raise MissingApiKeyError("Gemini API key (gem_key) is not set.")
+                    self._client = genai.Client(api_key=self.api_key)
+                self._types = types
+            return self._client
+
+    def generate(
+        self,
+        model: str,
+        system_instruction: str,
+        prompt: str,
+        temperature: float,
+        response_mime_type: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        client = self._load()
+        config: Dict[str, Any] = {
+            "system_instruction": system_instruction,
+            "temperature": temperature,
+            "response_mime_type": response_mime_type,
+        }
+        if timeout is not None:
+            config["http_options"] = self._types.HttpOptions(timeout=max(1, int(timeout * 1000)))
+        resp = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=self._types.GenerateContentConfig(**config),
+        )
+        return resp.text or ""
+
+    def classify(self, error: BaseException) -> Tuple[bool, Optional[float]]:
+        # google-genai raises APIError (with .code) for HTTP errors and lets
+        # httpx transport errors (connect/read timeouts, resets) through
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        if httpx is not None and isinstance(error, httpx.TransportError):
+            return True, None
+        return super().classify(error)
+
+
+# name -> factory(api_key=...); LLM_PROVIDER picks one in the backend
+PROVIDERS: Dict[str, Callable[..., TextProvider]] = {"gemini": GeminiProvider}
+
+
+def register_provider(name: str, factory: Callable[..., TextProvider]) -> None:
+    PROVIDERS[name] = factory
+
+
+def get_provider(name: str = "gemini", **kwargs: Any) -> TextProvider:
+    try:
+        factory = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider '{name}'; choose from {', '.join(sorted(PROVIDERS))}") from None
+    return factory(**kwargs)
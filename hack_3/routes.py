@@ -1,6 +1,22 @@
 from __future__ import annotations
-from flask import Blueprint, jsonify, request
-from user_class import Lab
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from flask import Blueprint, Response, jsonify, request
+from search_index import KINDS
+from user_class import Lab, User
+from jobs import JobQueue
+
+# Max users per GET /dashboards request
+MAX_BATCH_DASHBOARDS = 500
+# Max hits per GET /search request
+MAX_SEARCH_RESULTS = 100
+# Max updates per bulk import request
+MAX_BULK_UPDATES = 10000
+
+# Placeholder for a bulk line that failed to parse
+_NOT_JSON = object()
 
 users_bp = Blueprint("users", __name__)
 
@@ -14,18 +30,137 @@ def _require_json_object(payload):
     return True, None
 
 
-def _validate_update_obj(payload: dict):
-    # Expected: {"Data": "...", "Text_Update": "..."}
+def _clean_update_obj(payload: dict) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    # Expected: {"Data": "...", "Text_Update": "..."} -> (cleaned, None) or (None, error)
     data = payload.get("Data")
     text = payload.get("Text_Update")
+
     if not isinstance(data, str) or not data.strip():
-        return False, (jsonify({"error": "Field 'Data' (non-empty string) is required"}), 400)
+        return None, "Field 'Data' (non-empty string) is required"
     if not isinstance(text, str) or not text.strip():
-        return False, (jsonify({"error": "Field 'Text_Update' (non-empty string) is required"}), 400)
-    return True, {"Data": data.strip(), "Text_Update": text.strip()}
+        return None, "Field 'Text_Update' (non-empty string) is required"
+
+    return {"Data": data.strip(), "Text_Update": text.strip()}, None
+
+
+def _validate_update_obj(payload: dict):
+    cleaned, error = _clean_update_obj(payload)
+    if error is not None:
+        return False, (jsonify({"error": error}), 400)
+    return True, cleaned
+
+
+def _utc_stamp(value: str) -> Optional[str]:
+    # ISO date or datetime -> the stored "created_at" shape, or None if invalid
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _bulk_items() -> Iterator[Tuple[int, Any]]:
+    # (line number, parsed item) from a JSON array body or, for any other
+    # content type, NDJSON read line by line off the request stream.
+    # Lines that aren't JSON come back as _NOT_JSON.
+    if request.mimetype == "application/json":
+        yield from enumerate(request.get_json(silent=True), 1)
+        return
+
+    for number, raw in enumerate(request.stream, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, _NOT_JSON
+
+
+def _read_bulk_updates():
+    """
+    Validates every item of a bulk body with the single-update rules.
+    An item may also carry "created_at" (ISO date or datetime) for
+    historical imports. Returns (True, (updates, errors)) or (False, response).
+    """
+    if request.mimetype == "application/json" and not isinstance(request.get_json(silent=True), list):
+        return False, (jsonify({"error": "JSON body must be an array"}), 400)
+
+    updates: List[Dict[str, str]] = []
+    errors: List[Dict[str, Any]] = []
+    for number, item in _bulk_items():
+        if len(updates) + len(errors) >= MAX_BULK_UPDATES:
+            return False, (jsonify({"error": f"At most {MAX_BULK_UPDATES} updates per request"}), 413)
+        if item is _NOT_JSON:
+            errors.append({"line": number, "error": "Not valid JSON"})
+            continue
+        if not isinstance(item, dict):
+            errors.append({"line": number, "error": "Update must be a JSON object"})
+            continue
 
+        cleaned, error = _clean_update_obj(item)
+        if error is None and "created_at" in item:
+            created_at = _utc_stamp(item["created_at"]) if isinstance(item["created_at"], str) else None
+            if created_at is None:
+                error = "Field 'created_at' must be an ISO date or datetime"
+            else:
+                cleaned["created_at"] = created_at
+        if error is not None:
+            errors.append({"line": number, "error": error})
+        else:
+            updates.append(cleaned)
+    return True, (updates, errors)
+
+
+def _event_stream(body: Iterator[str]) -> Response:
+    resp = Response(body, mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return resp
+
+
+# -------------------------
+# Conditional GET helpers
+# -------------------------
+def _set_validators(resp: Response, etag: str, last_modified: Optional[float]) -> Response:
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    return resp
+
+
+def _not_modified(etag: str, last_modified: Optional[float]) -> Optional[Response]:
+    """
+    A 304 if the client's If-None-Match (or, failing that, If-Modified-Since)
+    still matches. Called before any JSON is read or serialized.
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = int(last_modified) <= request.if_modified_since.timestamp()
+    else:
+        matched = False
+    if not matched:
+        return None
+    return _set_validators(Response(status=304), etag, last_modified)
+
+
+def _dashboard_payload(user: User) -> Dict[str, Any]:
+    project, wet, dry = user.load_dashboard()
+    return {
+        "user_id": user.user_id,
+        "project": project,
+        "wet_update": wet,
+        "dry_update": dry,
+    }
+
+
+def register_user_routes(lab: Lab, jobs: JobQueue, io_workers: int = 8) -> Blueprint:
+    # Bounded pool for batch dashboard reads
+    io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="dashboard-io")
 
-def register_user_routes(lab: Lab) -> Blueprint:
     # -----------------------------------------
     # GET: project
     # -----------------------------------------
@@ -69,21 +204,86 @@ def register_user_routes(lab: Lab) -> Blueprint:
         user = lab.get_user(user_id)
         if user is None:
             return jsonify({"error": "User not found"}), 404
-        project = user.load_project()
-        wet = user.load_wet()
-        dry = user.load_dry()
-        return jsonify(
-            {
-                "user_id": user_id,
-                "project": project,
-                "wet_update": wet,
-                "dry_update": dry,
-            }
-        ), 200
+        etag, last_modified = user.dashboard_version()
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return _set_validators(jsonify(_dashboard_payload(user)), etag, last_modified), 200
 
     # -----------------------------------------
-    # POST: append general update and trigger compute
+    # GET: live changes as Server-Sent Events
+    # /users/<id>/events for one user, /events for the whole lab.
+    # Event types: update, project, wet, dry, summaries, overflow
+    # -----------------------------------------
+    @users_bp.get("/users/<user_id>/events")
+    def get_user_events(user_id: str):
+        if lab.get_user(user_id) is None:
+            return jsonify({"error": "User not found"}), 404
+        return _event_stream(lab.events.stream(user_id))
+
+    @users_bp.get("/events")
+    def get_lab_events():
+        return _event_stream(lab.events.stream())
+
+    # -----------------------------------------
+    # GET: many dashboards in one request
+    # Query: ?ids=123,999 (default: every user, optionally ?role=...)
+    # -----------------------------------------
+    @users_bp.get("/dashboards")
+    def get_dashboards():
+        ids = request.args.get("ids")
+        if ids is not None:
+            user_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+        else:
+            user_ids = [row["user_id"] for row in lab.list_users(role=request.args.get("role"))]
+
+        if len(user_ids) > MAX_BATCH_DASHBOARDS:
+            return jsonify({"error": f"At most {MAX_BATCH_DASHBOARDS} users per request"}), 400
+
+        users = []
+        missing = []
+        for user_id in user_ids:
+            user = lab.get_user(user_id)
+            if user is None:
+                missing.append(user_id)
+            else:
+                users.append(user)
+
+        dashboards = []
+        for user, payload in zip(users, io_pool.map(_dashboard_payload, users)):
+            dashboards.append({**payload, "name": user.name, "role": user.role})
+
+        return jsonify({"dashboards": dashboards, "missing": missing}), 200
+
+    # -----------------------------------------
+    # GET: full-text search
+    # Query: ?q=pcr buffer&user_id=123&kind=update&limit=20
+    # Searches updates (Data/Text_Update), project Name/description and
+    # the generated wet/dry summaries; best matches first.
+    # -----------------------------------------
+    @users_bp.get("/search")
+    def search():
+        q = request.args.get("q", "")
+        user_id = request.args.get("user_id")
+        kind = request.args.get("kind")
+        limit = request.args.get("limit", "20")
+
+        if not q.strip():
+            return jsonify({"error": "Query parameter 'q' is required"}), 400
+        if kind is not None and kind not in KINDS:
+            return jsonify({"error": f"Query parameter 'kind' must be one of {', '.join(KINDS)}"}), 400
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_SEARCH_RESULTS:
+            return jsonify(
+                {"error": f"Query parameter 'limit' must be between 1 and {MAX_SEARCH_RESULTS}"}
+            ), 400
+
+        results = lab.search.search(q, user_id=user_id, kind=kind, limit=int(limit))
+        return jsonify({"q": q, "results": results}), 200
+
+    # -----------------------------------------
+    # POST: append general update and queue wet/dry recompute
     # Body: {"Data": "...", "Text_Update": "..."}
+    # Returns 202 with a job_id; poll GET /jobs/<job_id>
     # -----------------------------------------
     @users_bp.post("/users/<user_id>/updates")
     def post_update(user_id: str):
@@ -103,13 +303,52 @@ def register_user_routes(lab: Lab) -> Blueprint:
         # 1) store raw update
         user.add_update(cleaned_or_err)
 
-        # 2) trigger your internal wet/dry computation (you implement)
-        try:
-            user.compute_wet_and_dry()
-        except NotImplementedError:
-            # It's fine for now; you'll implement later
-            pass
+        # 2) queue wet/dry computation (coalesced per user)
+        job = jobs.submit(user_id)
+
+        return jsonify({"status": "accepted", "update": cleaned_or_err, "job_id": job.job_id}), 202
+
+    # -----------------------------------------
+    # POST: bulk import of updates (group commit) + one recompute
+    # Body: NDJSON, one {"Data": "...", "Text_Update": "..."} per line
+    #       (or a JSON array with Content-Type: application/json)
+    # Each item may also set "created_at" for historical entries.
+    # Any invalid item => 400 with per-line errors and nothing stored,
+    # unless ?skip_invalid=1, which stores the valid items
+    # (200 instead of 201 if there were none).
+    # -----------------------------------------
+    @users_bp.post("/users/<user_id>/updates/bulk")
+    def post_updates_bulk(user_id: str):
+        user = lab.get_user(user_id)
+        if user is None:
+            return jsonify({"error": "User not found"}), 404
 
-        return jsonify({"status": "ok", "update": cleaned_or_err}), 201
+        ok, parsed_or_err = _read_bulk_updates()
+        if not ok:
+            return parsed_or_err
+        updates, errors = parsed_or_err
+
+        if errors and request.args.get("skip_invalid") != "1":
+            return jsonify({"error": "Invalid updates; nothing was stored", "errors": errors}), 400
+        if not updates:
+            return jsonify({"status": "ok", "stored": 0, "errors": errors, "job_id": None}), 200
+
+        user.add_updates(updates)
+        # One wet/dry recompute for the whole batch
+        job = jobs.submit(user_id)
+
+        return jsonify(
+            {"status": "accepted", "stored": len(updates), "errors": errors, "job_id": job.job_id}
+        ), 202
+
+    # -----------------------------------------
+    # GET: background job status
+    # -----------------------------------------
+    @users_bp.get("/jobs/<job_id>")
+    def get_job(job_id: str):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict()), 200
 
     return users_bp
\ No newline at end of file
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, IO, Iterator, Optional
+
+from metrics import data_io
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+class _PathLock:
+    """
+    Exclusive lock on a lock file, re-entrant within a thread.
+
+    Threads in this process serialize on an RLock; the outermost holder
+    also takes an flock() on the file so other worker processes (e.g.
+    gunicorn) serialize too.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_PathLock":
+        self._rlock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            self._depth += 1
+        except BaseException:
+            self._rlock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+
+_locks: Dict[str, _PathLock] = {}
+_locks_guard = threading.Lock()
+
+
+def write_lock(lock_path: str) -> _PathLock:
+    """
+    Returns the process-wide lock for `lock_path`; use as a context manager:
+      with write_lock("Data/locks/123.lock"):
+          ...
+    """
+    with _locks_guard:
+        lock = _locks.get(lock_path)
+        if lock is None:
+            lock = _locks[lock_path] = _PathLock(lock_path)
+        return lock
+
+
+@contextmanager
+def atomic_open(path: str) -> Iterator[IO[str]]:
+    """
+    Yields a temp file next to `path`; on success it is fsynced and renamed
+    over `path`, so readers see either the old or the new file, never a
+    truncated one. On error the temp file is removed and `path` is untouched.
+    """
+    with data_io("write", path):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        _fsync_dir(directory)
+
+
+def _fsync_dir(directory: str) -> None:
+    # Persist the rename itself; not supported on every platform.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = 2) -> None:
+    with atomic_open(path) as file:
+        json.dump(data, file, indent=indent)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class SummaryCache:
+    """
+    Persistent, content-addressed cache of Gemini summaries (SQLite, WAL).
+
+    Key = sha256 of (model, system prompt, temperature, update text), so a
+    summary is reused whenever the exact same request would be sent again.
+    Total stored text is capped at `max_bytes`; least recently used entries
+    are evicted first. The total is kept in a meta row by triggers, so a
+    put never sums the table. Hits only note the time in memory; last_used
+    is written in one batch every `touch_interval` seconds and before
+    every eviction sweep, so a read costs no write or fsync.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, touch_interval: float = 60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> last hit time, not yet written to last_used
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS summaries_size_insert AFTER INSERT ON summaries BEGIN
+                UPDATE meta SET value = value + new.size WHERE key = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS summaries_size_delete AFTER DELETE ON summaries BEGIN
+                UPDATE meta SET value = value - old.size WHERE key = 'total_bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS summaries_size_update AFTER UPDATE OF size ON summaries BEGIN
+                UPDATE meta SET value = value + new.size - old.size WHERE key = 'total_bytes';
+            END;
+            """
+        )
+        # Caches created before the meta row existed are summed once
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) "
+            "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM summaries"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, system_instruction: str, temperature: float, text_update: str) -> str:
+        payload = json.dumps([model, system_instruction, temperature, text_update], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if time.monotonic() - self._flushed_at >= self.touch_interval:
+                self._flush_touches()
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, summary: str) -> None:
+        size = len(summary.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "summary = excluded.summary, size = excluded.size, last_used = excluded.last_used",
+                (key, summary, size, time.time()),
+            )
+            self._touched.pop(key, None)
+            self._evict()
+            self._conn.commit()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total()
+
+    def _total(self) -> int:
+        (total,) = self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()
+        return total
+
+    def _flush_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE summaries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._flushed_at = time.monotonic()
+
+    def _evict(self) -> None:
+        total = self._total()
+        if total <= self.max_bytes:
+            return
+        # Recent hits must count before picking the least recently used
+        self._flush_touches()
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM summaries ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM summaries WHERE key = ?", victims)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
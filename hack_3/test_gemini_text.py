@@ -0,0 +1,43 @@
+import time
+
+import pytest
+from generate_wet_dry_json import CircuitBreaker, TokenBucket, gemini_text
+from llm_provider import TextProvider
+
+
+class FakeProvider(TextProvider):
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+
+    def generate(self, model, system_instruction, prompt, temperature, response_mime_type=None, timeout=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return "ok"
+
+
+def call(provider, **kwargs):
+    return gemini_text(provider, "m", "sys", "text", 0.0, retries=1, **kwargs)
+
+
+def test_half_open_probe_is_released_when_the_deadline_passes_in_the_limiter():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    with pytest.raises(RuntimeError):
+        call(FakeProvider(ConnectionError("down")), breaker=breaker)
+    assert breaker.status()["state"] == "open"
+    time.sleep(0.1)
+
+    # Cooldown over: the next call would be the trial call, but the
+    # deadline runs out while it waits for a limiter token
+    limiter = TokenBucket(rate=5.0)
+    limiter.acquire()
+    provider = FakeProvider()
+    with pytest.raises(RuntimeError):
+        call(provider, breaker=breaker, limiter=limiter, deadline=0.01)
+    assert provider.calls == 0
+    assert breaker.status()["state"] != "half_open"
+
+    # The trial call is still available to the next caller
+    assert call(provider, breaker=breaker) == "ok"
+    assert breaker.status()["state"] == "closed"
@@ -0,0 +1,468 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import threading
+import uuid
+from typing import IO, Callable, Dict, Any, Iterator, Optional, List, Tuple
+
+from metrics import data_io
+from read_cache import file_stamp, files_version
+from read_cache import load_json_file
+from safe_io import atomic_open, atomic_write_json, write_lock
+
+
+def _key(update: Dict[str, Any]) -> str:
+    # "created_at" is ISO UTC, so string order is date order; undated (legacy) records sort first
+    return str(update.get("created_at", ""))
+
+
+class CursorExpiredError(ValueError):
+    """An offset handed out before the log was last rewritten (see UpdateLog.epoch)."""
+
+
+class UpdateLog:
+    """
+    Append-only update history stored as JSON Lines, kept in date order:
+      Data/updates/{user_id}_updates.jsonl
+
+    One update per line:
+      {"Data": "...", "Text_Update": "...", "created_at": "2026-01-12T09:30:00Z"}
+
+    Appends cost one write + fsync regardless of history length. An append
+    older than the newest record (a historical import) rewrites the log in
+    order instead. A sidecar index ({user_id}_updates_index.json) keeps the
+    date and byte offset of every `index_every`-th record, so query() finds
+    a date range or the last N records with a bisect and a bounded read.
+    A legacy JSON-array file ({user_id}_updates.json) is migrated into
+    the log the first time it is opened, then kept as *.json.migrated.
+    `relocate`, if given, runs first (under the lock) to move the files
+    in from an older directory layout.
+    Appends, compaction and migration hold the write lock at `lock_path`
+    (shared with other writers of the same user, across processes).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_path: Optional[str] = None,
+        compact_every: int = 1000,
+        lock_path: Optional[str] = None,
+        relocate: Optional[Callable[[], None]] = None,
+        index_path: Optional[str] = None,
+        index_every: int = 64,
+    ):
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        self.index_every = index_every
+        self.legacy_path = legacy_path
+        self.relocate = relocate
+        self.lock_path = lock_path or f"{path}.lock"
+        self.compact_every = compact_every
+        self._appends_since_compact = 0
+        self._dirty = False
+        self._opened = False
+        # Last index seen (never modified in place) and the sidecar's file_stamp when it was read
+        self._index: Optional[Dict[str, Any]] = None
+        self._index_stamp: Optional[Tuple[int, int, int]] = None
+        self._index_lock = threading.Lock()
+
+    # -------------------------
+    # OPEN / MIGRATE
+    # -------------------------
+    def _open(self) -> None:
+        if self._opened:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if (self.relocate or self.legacy_path) and not os.path.exists(self.path):
+            with write_lock(self.lock_path):
+                if self.relocate is not None:
+                    self.relocate()
+                # Another worker may have migrated while we waited
+                if self.legacy_path and not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+                    self._migrate_legacy()
+        self._opened = True
+
+    def _migrate_legacy(self) -> None:
+        try:
+            with data_io("read", self.legacy_path), open(self.legacy_path, "r") as file:
+                updates = json.load(file)
+        except (OSError, ValueError):
+            updates = []
+        if not isinstance(updates, list):
+            updates = []
+
+        self._rewrite([u for u in updates if isinstance(u, dict)])
+        os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+
+    # -------------------------
+    # READERS
+    # -------------------------
+    def read_all(self) -> List[Dict[str, Any]]:
+        """
+        Returns every well-formed update in append order.
+        A torn trailing line (crash mid-append) is skipped and the log is
+        marked for compaction.
+        """
+        self._open()
+        updates: List[Dict[str, Any]] = []
+        try:
+            with data_io("read", self.path), open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    record = self._parse_line(line)
+                    if record is not None:
+                        updates.append(record)
+        except FileNotFoundError:
+            return []
+        return updates
+
+    def version(self) -> Tuple[str, Optional[float]]:
+        """(ETag, Last-Modified) of the log, after any pending migration."""
+        self._open()
+        return files_version([self.path])
+
+    def epoch(self) -> str:
+        """
+        Changes whenever the log is rewritten (sorting, compaction), i.e.
+        whenever byte offsets handed out earlier may have become invalid.
+        Pass it back to query() to have stale offsets rejected.
+        """
+        self._open()
+        return self._load_index()["epoch"]
+
+    def query(
+        self,
+        start: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        last: Optional[int] = None,
+        epoch: Optional[str] = None,
+    ) -> Tuple[str, Iterator[Tuple[Dict[str, Any], int]]]:
+        """
+        Like iter_records(start), restricted to since <= created_at <= until
+        (both inclusive and compared on their own length, so "2026-01-12"
+        covers the whole day) and to the newest `last` records of the log.
+        Returns (epoch, records); the offsets in `records` are only valid
+        together with that epoch.
+
+        The read starts at the index entry found by bisecting for `since` /
+        `last` (at most index_every - 1 extra records are read) and stops at
+        the first record past `until`. A `start` past that entry (a resume
+        cursor) is used as is.
+
+        Raises (eagerly) CursorExpiredError if `start` > 0 was handed out
+        under an `epoch` other than the current one, and ValueError if
+        `start` is not a record boundary.
+        """
+        self._open()
+        file, index = self._open_indexed()
+        if file is None:
+            if start > 0:
+                raise ValueError("offset is past the end of the log")
+            return index["epoch"], iter(())
+        try:
+            if start > 0 and epoch is not None and epoch != index["epoch"]:
+                raise CursorExpiredError("the log was rewritten since this offset was handed out")
+            self._check_offset(file, start)
+        except BaseException:
+            file.close()
+            raise
+
+        if since is None and until is None and last is None:
+            return index["epoch"], self._iter_file(file, start)
+
+        entries = index["entries"]
+        begin, ordinal = 0, 0
+        if since is not None:
+            i = bisect.bisect_left([entry[0] for entry in entries], since) - 1
+            if i >= 0:
+                begin, ordinal = entries[i][1], entries[i][2]
+        first = 0
+        if last is not None:
+            first = max(0, index["count"] - last)
+            j = bisect.bisect_right([entry[2] for entry in entries], first) - 1
+            if j >= 0 and entries[j][1] > begin:
+                begin, ordinal = entries[j][1], entries[j][2]
+        if start > begin:
+            # Resuming a page that already started past `first`
+            first = 0
+        records = self._iter_file(file, max(start, begin))
+        return index["epoch"], self._select(records, ordinal, first, since, until)
+
+    @staticmethod
+    def _select(
+        records: Iterator[Tuple[Dict[str, Any], int]],
+        ordinal: int,
+        first: int,
+        since: Optional[str],
+        until: Optional[str],
+    ) -> Iterator[Tuple[Dict[str, Any], int]]:
+        for record, end in records:
+            key = _key(record)
+            if until is not None and key[: len(until)] > until:
+                return
+            if ordinal >= first and (since is None or key >= since):
+                yield record, end
+            ordinal += 1
+
+    def iter_records(self, start: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """
+        Lazily yields (update, end_offset) pairs starting at byte offset
+        `start`, which must be 0 or an offset previously returned by this
+        method. end_offset is where the next record begins, so it can be
+        handed back to a client as a resume cursor (with epoch(), see query()).
+
+        Raises ValueError (eagerly) if `start` is not a record boundary.
+        """
+        self._open()
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            if start > 0:
+                raise ValueError("offset is past the end of the log")
+            return iter(())
+        try:
+            self._check_offset(file, start)
+        except BaseException:
+            file.close()
+            raise
+        return self._iter_file(file, start)
+
+    @staticmethod
+    def _check_offset(file: IO[bytes], start: int) -> None:
+        if start < 0:
+            raise ValueError("offset must be non-negative")
+        if start > 0:
+            file.seek(start - 1)
+            if file.read(1) != b"\n":
+                raise ValueError("offset is not a record boundary")
+
+    def _read_lines(self, file: IO[bytes], start: int) -> Iterator[bytes]:
+        # Complete lines from `start`, read in timed chunks. A trailing line
+        # without "\n" (append still in flight, or torn) is not yielded.
+        file.seek(start)
+        tail = b""
+        while True:
+            with data_io("read", self.path):
+                chunk = file.read(1 << 16)
+            if not chunk:
+                return
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                yield line + b"\n"
+
+    def _iter_file(self, file: IO[bytes], start: int) -> Iterator[Tuple[Dict[str, Any], int]]:
+        # Owns `file`: it is closed when the iteration ends
+        with file:
+            offset = start
+            for raw in self._read_lines(file, start):
+                offset += len(raw)
+                record = self._parse_line(raw.decode("utf-8"))
+                if record is not None:
+                    yield record, offset
+
+    def _parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            self._dirty = True
+            return None
+        if not isinstance(record, dict):
+            self._dirty = True
+            return None
+        return record
+
+    # -------------------------
+    # DATE INDEX
+    # -------------------------
+    def _new_index(self) -> Dict[str, Any]:
+        return {
+            "epoch": uuid.uuid4().hex[:12],
+            "inode": None,
+            "size": 0,
+            "count": 0,
+            "last": "",
+            "sorted": True,
+            # [created_at, byte offset, ordinal] of every index_every-th record
+            "entries": [],
+        }
+
+    def _index_record(self, index: Dict[str, Any], key: str, offset: int) -> None:
+        if index["count"] % self.index_every == 0:
+            index["entries"].append([key, offset, index["count"]])
+        if key < index["last"]:
+            index["sorted"] = False
+        index["count"] += 1
+        index["last"] = max(index["last"], key)
+
+    def _scan(self, index: Dict[str, Any], file) -> None:
+        # Indexes the complete records between index["size"] and the end of `file`
+        offset = index["size"]
+        for raw in self._read_lines(file, offset):
+            record = self._parse_line(raw.decode("utf-8"))
+            if record is not None:
+                self._index_record(index, _key(record), offset)
+            offset += len(raw)
+        index["size"] = offset
+
+    def _current_index(self, file) -> Optional[Dict[str, Any]]:
+        """
+        The index of the open log `file`, plus any records appended since
+        it was saved. The parsed index is kept in memory and only re-read
+        when the sidecar changes on disk (another process saved or rebuilt
+        it); otherwise just the new tail of the log is scanned. None if it
+        is missing or belongs to an older copy of the log.
+        """
+        stat = os.fstat(file.fileno())
+        stamp = file_stamp(self.index_path)
+        with self._index_lock:
+            index = self._index
+            if index is None or stamp != self._index_stamp:
+                index = load_json_file(self.index_path)
+            elif index["size"] < stat.st_size:
+                # Cached copies are never changed in place; readers may hold one
+                index = {**index, "entries": list(index["entries"])}
+            if (
+                not isinstance(index, dict)
+                or index.get("inode") != stat.st_ino
+                or index.get("size", 0) > stat.st_size
+            ):
+                return None
+            if index["size"] < stat.st_size:
+                self._scan(index, file)
+            self._index, self._index_stamp = index, stamp
+            return index
+
+    def _open_indexed(self) -> Tuple[Optional[IO[bytes]], Dict[str, Any]]:
+        """
+        (log opened for reading, its index); the file is None if the log
+        does not exist yet. An unsorted or stale index is rebuilt first.
+        """
+        while True:
+            try:
+                file = open(self.path, "rb")
+            except FileNotFoundError:
+                index = self._new_index()
+                index["epoch"] = ""
+                return None, index
+            index = self._current_index(file)
+            if index is not None and index["sorted"]:
+                return file, index
+            file.close()
+            with write_lock(self.lock_path):
+                # Another writer may have rebuilt it while we waited
+                with open(self.path, "rb") as file:
+                    index = self._current_index(file)
+                if index is None or not index["sorted"]:
+                    self._reindex()
+
+    def _load_index(self) -> Dict[str, Any]:
+        file, index = self._open_indexed()
+        if file is not None:
+            file.close()
+        return index
+
+    def _reindex(self) -> Dict[str, Any]:
+        # Write lock held. Logs written before the index existed may be out of order.
+        index = self._new_index()
+        with open(self.path, "rb") as file:
+            index["inode"] = os.fstat(file.fileno()).st_ino
+            self._scan(index, file)
+        if not index["sorted"]:
+            return self._rewrite(self.read_all())
+        self._save_index(index)
+        return index
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        # Write lock held, so nobody else can save in between and the stamp is ours
+        atomic_write_json(self.index_path, index, indent=None)
+        with self._index_lock:
+            self._index, self._index_stamp = index, file_stamp(self.index_path)
+
+    # -------------------------
+    # WRITERS
+    # -------------------------
+    def append(self, update: Dict[str, Any]) -> None:
+        self.append_many([update])
+
+    def append_many(self, updates: List[Dict[str, Any]]) -> None:
+        """
+        Appends all `updates` with a single write + fsync (group commit),
+        so a bulk import costs about the same as one append. Updates dated
+        before the newest record are merged in by rewriting the log.
+        """
+        if not updates:
+            return
+        self._open()
+        data = "".join(
+            json.dumps(update, ensure_ascii=False, separators=(",", ":")) + "\n" for update in updates
+        ).encode("utf-8")
+
+        with write_lock(self.lock_path):
+            index = self._load_index()
+            keys = [_key(update) for update in updates]
+            if keys != sorted(keys) or keys[0] < index["last"]:
+                self._rewrite(self.read_all() + updates)
+                self._dirty = False
+                self._appends_since_compact = 0
+                return
+
+            with data_io("append", self.path), open(self.path, "a+b") as file:
+                # A previous crash may have left a partial line without "\n";
+                # start on a fresh line so the new records stay parseable.
+                if file.tell() > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        file.write(b"\n")
+                        self._dirty = True
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+                # The index is only saved when it gains an entry; readers
+                # scan the few records appended since then themselves.
+                entries = len(index["entries"])
+                if index["inode"] is None:
+                    # This append created the log
+                    index = self._new_index()
+                    index["inode"] = os.fstat(file.fileno()).st_ino
+                    self._scan(index, file)
+                    self._save_index(index)
+                else:
+                    index = self._current_index(file)
+                    if index is not None and len(index["entries"]) != entries:
+                        self._save_index(index)
+
+            self._appends_since_compact += len(updates)
+            if self._dirty and self._appends_since_compact >= self.compact_every:
+                self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrites the log with only well-formed records (temp file + fsync +
+        rename), dropping torn or corrupt lines.
+        """
+        with write_lock(self.lock_path):
+            self._rewrite(self.read_all())
+            self._dirty = False
+            self._appends_since_compact = 0
+
+    def _rewrite(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Stable sort: records with the same created_at keep their order
+        index = self._new_index()
+        offset = 0
+        with atomic_open(self.path) as file:
+            for update in sorted(updates, key=_key):
+                line = json.dumps(update, ensure_ascii=False, separators=(",", ":")) + "\n"
+                file.write(line)
+                self._index_record(index, _key(update), offset)
+                offset += len(line.encode("utf-8"))
+        index["size"] = offset
+        index["inode"] = os.stat(self.path).st_ino
+        self._save_index(index)
+        return index
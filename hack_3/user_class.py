@@ -1,14 +1,161 @@
 from __future__ import annotations
-import json
 import os
-from typing import Dict, Any, Optional, List
-from generate_wet_dry_json import main
-key = os.environ.get("gem_key",None)
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional, List, Tuple
+from data_paths import DataPaths
+from events import EventBus
+from metrics import data_io
+from read_cache import ReadCache, files_version, load_json_file
+from safe_io import atomic_write_json, write_lock
+from search_index import SearchIndex
+from update_log import UpdateLog
+from user_registry import UserRegistry
+
+if TYPE_CHECKING:
+    from generate_wet_dry_json import WetDrySummarizer
+
+
+def _count_updates(record: Dict[str, Any], appended: List[Dict[str, Any]]) -> None:
+    meta = record.setdefault("updates", {"count": 0, "last_created_at": None})
+    meta["count"] += len(appended)
+    # Historical imports may be older than what is already stored
+    meta["last_created_at"] = max(
+        [meta["last_created_at"] or ""] + [str(u.get("created_at", "")) for u in appended]
+    ) or None
+
+
 class User:
-    def __init__(self, user_id: str, name: str, role: str):
+    def __init__(self, user_id: str, name: str, role: str, paths: Optional[DataPaths] = None):
         self.user_id = user_id
         self.name = name
         self.role = role
+        self._use_paths(paths or DataPaths())
+        # Shared document cache, event bus, search index and summarizer, attached by Lab.add_user
+        self._cache: Optional[ReadCache] = None
+        self._events: Optional[EventBus] = None
+        self._search: Optional[SearchIndex] = None
+        self._summarizer: Optional["WetDrySummarizer"] = None
+        # Serve project/wet/dry from the consolidated record (Lab(consolidated=True))
+        self._consolidated = False
+
+    def _use_paths(self, paths: DataPaths) -> None:
+        self._paths = paths
+        # Serializes this user's writers across threads and worker processes
+        self._lock_path = paths.lock(self.user_id)
+        self._updates = UpdateLog(
+            paths.user_file(self.user_id, "updates"),
+            legacy_path=paths.user_file(self.user_id, "legacy_updates"),
+            lock_path=self._lock_path,
+            relocate=lambda: self._claim("updates", "legacy_updates", "legacy_updates_migrated"),
+            index_path=paths.user_file(self.user_id, "updates_index"),
+        )
+
+    def _claim(self, *kinds: str) -> None:
+        # Moves files from the flat layout into this user's shard (write lock held)
+        for kind in kinds:
+            self._paths.claim(self.user_id, kind)
+
+    def _read_json(self, kind: str, loader: Optional[Callable[[str], Any]] = None) -> Any:
+        path = self._paths.resolve(self.user_id, kind)
+        data = self._load(path, loader)
+        if data is None and path != self._paths.user_file(self.user_id, kind):
+            # Moved into its shard between resolve() and the read
+            data = self._load(self._paths.user_file(self.user_id, kind), loader)
+        return data
+
+    def _load(self, path: str, loader: Optional[Callable[[str], Any]] = None) -> Any:
+        def load() -> Any:
+            return (loader or load_json_file)(path)
+
+        if self._cache is None:
+            return load()
+        return self._cache.get(path, load)
+
+    # -------------------------
+    # CONSOLIDATED RECORD
+    # -------------------------
+    def _record(self) -> Dict[str, Any]:
+        """
+        Reads the compact per-user record:
+          Data/records/{shard}/{user_id}_record.json
+        Expected:
+          {"project": {...} | null, "wet": {...}, "dry": {...},
+           "updates": {"count": 12, "last_created_at": "..."}}
+        Built from the separate files the first time it is needed.
+        """
+        path = self._paths.user_file(self.user_id, "record")
+        record = self._load(path)
+        if isinstance(record, dict):
+            return record
+        with write_lock(self._lock_path):
+            record = load_json_file(path)
+            if not isinstance(record, dict):
+                record = self._build_record()
+                atomic_write_json(path, record, indent=None)
+        self._invalidate(path)
+        return record
+
+    def _build_record(self) -> Dict[str, Any]:
+        # Straight from disk: the separate files stay the source of truth
+        def read(kind: str) -> Any:
+            return load_json_file(self._paths.resolve(self.user_id, kind))
+
+        updates = self._updates.read_all()
+        project = read("projects")
+        wet = read("wet")
+        dry = read("dry")
+        return {
+            "project": project if isinstance(project, dict) else None,
+            "wet": wet if isinstance(wet, dict) else {},
+            "dry": dry if isinstance(dry, dict) else {},
+            "updates": {
+                "count": len(updates),
+                "last_created_at": updates[-1].get("created_at") if updates else None,
+            },
+        }
+
+    def _update_record(self, change: Callable[[Dict[str, Any]], None]) -> None:
+        # Called with the write lock held, after the separate files were written
+        path = self._paths.user_file(self.user_id, "record")
+        if not self._consolidated:
+            # A record left by an earlier consolidated run would now go stale
+            try:
+                with data_io("write", path):
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        record = load_json_file(path)
+        if isinstance(record, dict):
+            change(record)
+        else:
+            record = self._build_record()
+        atomic_write_json(path, record, indent=None)
+        self._invalidate(path)
+
+    def _invalidate(self, path: str) -> None:
+        if self._cache is not None:
+            self._cache.invalidate(path)
+
+    def _publish(self, event: str, data: Dict[str, Any]) -> None:
+        if self._events is not None:
+            self._events.publish(self.user_id, event, data)
+
+    def reindex(self) -> None:
+        """
+        Rebuilds this user's search entries from the files on disk, under
+        the write lock so no concurrent write is lost or indexed twice.
+        """
+        if self._search is None:
+            return
+        with write_lock(self._lock_path):
+            self._search.rebuild_user(
+                self.user_id,
+                self._updates.read_all(),
+                {"project": self.load_project(), "wet": self.load_wet(), "dry": self.load_dry()},
+            )
 
     # -------------------------
     # READERS (GET endpoints)
@@ -16,86 +163,235 @@ class User:
     def load_project(self) -> Optional[Dict[str, Any]]:
         """
         Reads:
-          Data/project_descriptions/{user_id}_projects.json
+          Data/project_descriptions/{shard}/{user_id}_projects.json
         Expected:
           {"Name": "...", "description": "..."}
         """
-        try:
-            with open(f"Data/project_descriptions/{self.user_id}_projects.json", "r") as file:
-                print("Loading project for user:", self.user_id)
-                data = json.load(file)
-                return data if isinstance(data, dict) else None
-        except FileNotFoundError:
-            return None
+        def load(path: str) -> Any:
+            print("Loading project for user:", self.user_id)
+            return load_json_file(path)
+
+        if self._consolidated:
+            return self._record()["project"]
+        data = self._read_json("projects", load)
+        return data if isinstance(data, dict) else None
 
     def load_wet(self) -> Dict[str, Any]:
         """
         Reads:
-          Data/updates/{user_id}_wet_updates.json
+          Data/updates/{shard}/{user_id}_wet_updates.json
         Expected:
           {"Data": "...", "Text_Update": "..."}
         Returns {} if missing.
         """
-        try:
-            with open(f"Data/updates/{self.user_id}_wet_updates.json", "r") as file:
-                data = json.load(file)
-                return data if isinstance(data, dict) else {}
-        except FileNotFoundError:
-            return {}
+        if self._consolidated:
+            return self._record()["wet"]
+        data = self._read_json("wet")
+        return data if isinstance(data, dict) else {}
 
     def load_dry(self) -> Dict[str, Any]:
         """
         Reads:
-          Data/updates/{user_id}_dry_updates.json
+          Data/updates/{shard}/{user_id}_dry_updates.json
         Expected:
           {"Data": "...", "Text_Update": "..."}
         Returns {} if missing.
         """
-        try:
-            with open(f"Data/updates/{self.user_id}_dry_updates.json", "r") as file:
-                data = json.load(file)
-                return data if isinstance(data, dict) else {}
-        except FileNotFoundError:
-            return {}
+        if self._consolidated:
+            return self._record()["dry"]
+        data = self._read_json("dry")
+        return data if isinstance(data, dict) else {}
+
+    def load_dashboard(self) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+        """(project, wet, dry); a single cached read in consolidated mode."""
+        if self._consolidated:
+            record = self._record()
+            return record["project"], record["wet"], record["dry"]
+        return self.load_project(), self.load_wet(), self.load_dry()
+
+    def dashboard_version(self) -> Tuple[str, Optional[float]]:
+        """(ETag, Last-Modified) of the dashboard documents, from file metadata only."""
+        if self._consolidated:
+            return files_version([self._paths.user_file(self.user_id, "record")])
+        return files_version([self._paths.resolve(self.user_id, kind) for kind in ("projects", "wet", "dry")])
 
     # -------------------------
     # WRITERS (POST endpoints)
     # -------------------------
     def add_update(self, update: Dict[str, Any]) -> None:
         """
-        Appends to:
-          Data/updates/{user_id}_updates.json
+        Appends one line to:
+          Data/updates/{shard}/{user_id}_updates.jsonl
         Expected:
           {"Data": "...", "Text_Update": "..."}
+        Stored with a "created_at" UTC timestamp (dates the wet/dry summaries).
         """
-        os.makedirs("Data/updates", exist_ok=True)
-        path = f"Data/updates/{self.user_id}_updates.json"
-        try:
-            with open(path, "r") as file:
-                updates = json.load(file)
-                if not isinstance(updates, list):
-                    updates = []
-        except FileNotFoundError:
-            updates = []
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        record = {**update, "created_at": created_at}
+        with write_lock(self._lock_path):
+            self._updates.append(record)
+            self._update_record(lambda r: _count_updates(r, [record]))
+            # Indexed under the lock so a concurrent reindex() sees it exactly once
+            if self._search is not None:
+                self._search.add_update(self.user_id, record)
+        self._publish("update", {"update": record})
 
-        updates.append(update)
-        with open(path, "w") as file:
-            json.dump(updates, file, indent=2)
+    def add_updates(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Bulk form of add_update: all records are appended with one write
+        and fsync. An update may carry its own "created_at" (historical
+        imports); the rest are stamped with the current time.
+        Publishes a single "updates" event; returns the stored records.
+        """
+        if not updates:
+            return []
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        records = [{**update, "created_at": update.get("created_at", created_at)} for update in updates]
+        with write_lock(self._lock_path):
+            self._updates.append_many(records)
+            self._update_record(lambda r: _count_updates(r, records))
+            if self._search is not None:
+                self._search.add_updates(self.user_id, records)
+        self._publish("updates", {"count": len(records)})
+        return records
 
 
 
     def compute_wet_and_dry(self) -> None:
-        update = f"Data/{self.user_id}_updates.json"
-        main()
-      
+        """
+        Incrementally summarizes updates appended since the last run:
+          Data/updates/{shard}/{user_id}_updates.jsonl        (input, read from saved offset)
+          Data/updates/{shard}/{user_id}_summary_state.json   (offset + log epoch + current latest wet/dry)
+          Data/updates/{shard}/{user_id}_wet_updates.json     (output)
+          Data/updates/{shard}/{user_id}_dry_updates.json     (output)
+        """
+        if self._summarizer is None:
+            raise NotImplementedError("No summarizer configured for this lab")
+
+        with write_lock(self._lock_path):
+            wet_path = self._paths.claim(self.user_id, "wet")
+            dry_path = self._paths.claim(self.user_id, "dry")
+            state_path = self._paths.claim(self.user_id, "summary_state")
+        try:
+            # Separate from the write lock so appends aren't blocked behind LLM calls
+            with write_lock(self._paths.lock(self.user_id, "recompute")):
+                state = self._summarizer.recompute(
+                    self._updates,
+                    wet_path,
+                    dry_path,
+                    state_path=state_path,
+                )
+        finally:
+            self._invalidate(wet_path)
+            self._invalidate(dry_path)
+        with write_lock(self._lock_path):
+            self._update_record(
+                lambda r: r.update(wet=load_json_file(wet_path) or {}, dry=load_json_file(dry_path) or {})
+            )
+            # Indexed under the lock so a concurrent reindex() sees it exactly once
+            if self._search is not None:
+                self._search.set_document(self.user_id, "wet", state["wet"] and {"latest": state["wet"]})
+                self._search.set_document(self.user_id, "dry", state["dry"] and {"latest": state["dry"]})
+        self._publish("summaries", {"wet": state["wet"], "dry": state["dry"]})
 
 
 class Lab:
-    def __init__(self) -> None:
-        self._users: Dict[str, User] = {}
+    """
+    Users live in a persistent UserRegistry; User objects are only built
+    when a user is looked up, and the most recently used `max_users` of
+    them are kept for reuse (an evicted user is rebuilt from the registry).
+
+    With consolidated=True each user also gets a compact record (project,
+    current wet/dry, update count) that serves dashboards in one read.
+    The separate files are still written, so the mode can be switched off.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 1024,
+        max_users: int = 1024,
+        summarizer: Optional["WetDrySummarizer"] = None,
+        consolidated: bool = False,
+        data_root: Optional[str] = None,
+        registry_path: Optional[str] = None,
+        search_path: Optional[str] = None,
+    ) -> None:
+        self.max_users = max_users
+        self._users: "OrderedDict[str, User]" = OrderedDict()
+        self._lock = threading.Lock()
+        # data_root defaults to $DATA_ROOT, then "Data"
+        self.paths = DataPaths(data_root)
+        self.paths.finish_if_migrated()
+        self.cache = ReadCache(max_entries=cache_size)
+        self.events = EventBus()
+        self.summarizer = summarizer
+        self.consolidated = consolidated
+        self.registry = UserRegistry(registry_path or self.paths.shared("users.sqlite3"))
+        self.search = SearchIndex(search_path or self.paths.shared("search.sqlite3"))
+
+    def _attach(self, user: User) -> User:
+        if user._paths is not self.paths:
+            user._use_paths(self.paths)
+        user._cache = self.cache
+        user._events = self.events
+        user._search = self.search
+        user._summarizer = self.summarizer
+        user._consolidated = self.consolidated
+        return user
+
+    def _remember(self, user: User) -> User:
+        # Lock held
+        self._users[user.user_id] = user
+        self._users.move_to_end(user.user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return user
 
     def get_user(self, user_id: str) -> Optional[User]:
-        return self._users.get(user_id)
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+                return user
+        row = self.registry.get(user_id)
+        if row is None:
+            return None
+        user = self._attach(User(user_id=row["user_id"], name=row["name"], role=row["role"], paths=self.paths))
+        with self._lock:
+            return self._remember(self._users.get(user_id) or user)
 
     def add_user(self, user: User) -> None:
-        self._users[user.user_id] = user
\ No newline at end of file
+        self.registry.upsert(user.user_id, user.name, user.role)
+        with self._lock:
+            self._remember(self._attach(user))
+
+    def users_generation(self) -> int:
+        """Changes whenever a user is added or replaced."""
+        return self.registry.generation()
+
+    def list_users(
+        self,
+        role: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """Registry rows (user_id, name, role), without building User objects."""
+        return self.registry.list(role=role, limit=limit, after=after)
+
+    def rebuild_search_index(self, if_needed: bool = False) -> int:
+        """
+        Re-indexes every registered user from Data/ and then marks the
+        index complete; returns the user count. With if_needed=True it
+        does nothing if a rebuild has already completed. One process
+        rebuilds at a time; the others wait and then find it done.
+        """
+        with write_lock(self.paths.shared(os.path.join("locks", "search_rebuild.lock"))):
+            if if_needed and self.search.indexed():
+                return 0
+            count = 0
+            for row in self.list_users():
+                self.get_user(row["user_id"]).reindex()
+                count += 1
+            self.search.optimize()
+            self.search.mark_indexed()
+        return count
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+
+class UserRegistry:
+    """
+    Persistent user directory (SQLite):
+      Data/users.sqlite3
+
+    Rows: user_id (primary key), name, role. An index on (role, user_id)
+    serves role-filtered listings; pagination is keyset on user_id, so a
+    page costs the same no matter how deep into the listing it is.
+    Nothing is loaded up front, so opening a large registry is instant.
+    A generation counter is bumped by every write (used for ETags).
+    """
+
+    def __init__(self, path: str = "Data/users.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                role TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS users_role ON users (role, user_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+        self._conn.commit()
+
+    def _bump_generation(self) -> None:
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    def generation(self) -> int:
+        with self._lock:
+            (value,) = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return value
+
+    def get(self, user_id: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, name, role FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"user_id": row[0], "name": row[1], "role": row[2]}
+
+    def insert(self, user_id: str, name: str, role: str) -> bool:
+        """Returns False if the user_id is already taken."""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO users (user_id, name, role) VALUES (?, ?, ?)", (user_id, name, role)
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._bump_generation()
+            self._conn.commit()
+        return True
+
+    def upsert(self, user_id: str, name: str, role: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, name, role) VALUES (?, ?, ?)", (user_id, name, role)
+            )
+            self._bump_generation()
+            self._conn.commit()
+
+    def list(
+        self,
+        role: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Users ordered by user_id, optionally filtered by role, starting
+        after the `after` user_id.
+        """
+        query = "SELECT user_id, name, role FROM users"
+        clauses = []
+        params: list = []
+        if role is not None:
+            clauses.append("role = ?")
+            params.append(role)
+        if after is not None:
+            clauses.append("user_id > ?")
+            params.append(after)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY user_id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{"user_id": r[0], "name": r[1], "role": r[2]} for r in rows]
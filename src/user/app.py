@@ -1,5 +1,9 @@
+import os
+import threading
+
 from flask import Flask, jsonify
 from flask_cors import CORS
+from metrics import REGISTRY, instrument_app
 from user_class import Lab
 from routes import register_user_routes
 
@@ -9,12 +13,26 @@ def create_app() -> Flask:
     CORS(app)  # Enable CORS for all routes
 
 
-    lab = Lab()
+    # DATA_CONSOLIDATED=1: one compact record per user serves the dashboard
+    lab = Lab(consolidated=os.environ.get("DATA_CONSOLIDATED") == "1")
     # Optional test user; you can remove once using POST /users
-    lab.create_user(user_id="123", name="Alice", role="student")
+    if lab.get_user("123") is None:
+        lab.create_user(user_id="123", name="Alice", role="student")
+    # Until a full rebuild of Data/ has completed once, index it in the
+    # background (search results are partial meanwhile) so startup doesn't
+    # wait on it; `python search_index.py` rebuilds from the command line
+    if not lab.search.indexed():
+        threading.Thread(
+            target=lab.rebuild_search_index, kwargs={"if_needed": True}, name="search-rebuild", daemon=True
+        ).start()
 
     app.register_blueprint(register_user_routes(lab))
 
+    # GET /metrics: route latencies, Data/ I/O and read cache counters
+    instrument_app(app)
+    REGISTRY.gauge_function("read_cache_hits", "Read cache hits since start", lambda: lab.cache.hits)
+    REGISTRY.gauge_function("read_cache_misses", "Read cache misses since start", lambda: lab.cache.misses)
+
     @app.get("/")
     def index():
         return jsonify(
@@ -24,13 +42,15 @@ def create_app() -> Flask:
                     "/health",
                     "/users/123/dashboard",
                     "/users/123/updates",
+                    "/search?q=pcr",
+                    "/metrics",
                 ],
             }
         )
 
     @app.get("/health")
     def health():
-        return jsonify({"status": "ok"})
+        return jsonify({"status": "ok", "read_cache": lab.cache.stats()})
 
     return app
 
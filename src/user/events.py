@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import itertools
+import json
+import queue
+import threading
+from typing import Any, Dict, Iterator, Optional, Set
+
+
+class Subscription:
+    """
+    One listener's bounded buffer. When a slow client falls `buffer_size`
+    events behind, the oldest events are dropped and an "overflow" event is
+    delivered instead, telling the client to refetch rather than replay.
+    """
+
+    def __init__(self, user_id: Optional[str], buffer_size: int):
+        self.user_id = user_id  # None = every user
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=buffer_size)
+        self._overflowed = False
+        self._lock = threading.Lock()
+
+    def put(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(event)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    self._overflowed = True
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event, or None if nothing arrived within `timeout` seconds."""
+        with self._lock:
+            if self._overflowed:
+                self._overflowed = False
+                return {"id": None, "event": "overflow", "data": {"user_id": self.user_id}}
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """
+    In-process pub/sub for data changes. Writers call publish(); each
+    Server-Sent Events connection holds one Subscription.
+    """
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self._ids = itertools.count(1)
+        self._subs: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(user_id, self.buffer_size)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, user_id: str, event: str, data: Dict[str, Any]) -> None:
+        message = {"id": next(self._ids), "event": event, "data": {"user_id": user_id, **data}}
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if sub.user_id is None or sub.user_id == user_id:
+                sub.put(message)
+
+    def stream(self, user_id: Optional[str] = None, heartbeat: float = 15.0) -> Iterator[str]:
+        """
+        Subscribes and encodes events as text/event-stream. Sends a comment
+        line every `heartbeat` idle seconds; unsubscribes when the client
+        goes away (the generator is closed).
+        """
+        sub = self.subscribe(user_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                message = sub.get(timeout=heartbeat)
+                if message is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                lines = []
+                if message["id"] is not None:
+                    lines.append(f"id: {message['id']}")
+                lines.append(f"event: {message['event']}")
+                lines.append(f"data: {json.dumps(message['data'])}")
+                yield "\n".join(lines) + "\n\n"
+        finally:
+            self.unsubscribe(sub)
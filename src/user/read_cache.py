@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import data_io
+
+
+def load_json_file(path: str) -> Any:
+    """
+    Parses a JSON document from disk.
+    Returns None if the file is missing.
+    """
+    try:
+        with data_io("read", path), open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, inode) of a file, or None if missing. One stat, no read."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def files_version(paths: List[str]) -> Tuple[str, Optional[float]]:
+    """
+    Validators for a response built from `paths`, using metadata only:
+    (strong ETag value, Last-Modified as epoch seconds or None).
+    Any write (atomic rename included) changes the ETag.
+    """
+    stamps = [file_stamp(path) for path in paths]
+    etag = hashlib.sha1(repr(stamps).encode("utf-8")).hexdigest()
+    mtimes = [stamp[0] / 1e9 for stamp in stamps if stamp is not None]
+    return etag, (max(mtimes) if mtimes else None)
+
+
+class ReadCache:
+    """
+    Bounded LRU of parsed JSON documents, keyed by file path.
+
+    Each entry remembers the file's stamp when it was loaded, so a
+    write from another process is picked up on the next read. Writers in
+    this process call invalidate() right after writing.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[Tuple[int, int, int]], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, loader: Callable[[], Any]) -> Any:
+        stamp = file_stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            self._entries[path] = (stamp, value)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -1,7 +1,25 @@
 from __future__ import annotations
 
-from flask import Blueprint, jsonify, request
-from user_class import Lab
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request
+from search_index import KINDS
+from update_log import CursorExpiredError
+from user_class import Lab, User
+
+# Max users per GET /dashboards request
+MAX_BATCH_DASHBOARDS = 500
+# Max hits per GET /search request
+MAX_SEARCH_RESULTS = 100
+# Max updates per bulk import request
+MAX_BULK_UPDATES = 10000
+
+# Placeholder for a bulk line that failed to parse
+_NOT_JSON = object()
 
 users_bp = Blueprint("users", __name__)
 
@@ -28,20 +46,211 @@ def _validate_project(payload: dict):
     return True, {"Name": name.strip(), "description": description.strip()}
 
 
-def _validate_update_obj(payload: dict):
-    # Expected: {"Data": "...", "Text_Update": "..."}
+def _clean_update_obj(payload: dict) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    # Expected: {"Data": "...", "Text_Update": "..."} -> (cleaned, None) or (None, error)
     data = payload.get("Data")
     text = payload.get("Text_Update")
 
     if not isinstance(data, str) or not data.strip():
-        return False, (jsonify({"error": "Field 'Data' (non-empty string) is required"}), 400)
+        return None, "Field 'Data' (non-empty string) is required"
     if not isinstance(text, str) or not text.strip():
-        return False, (jsonify({"error": "Field 'Text_Update' (non-empty string) is required"}), 400)
+        return None, "Field 'Text_Update' (non-empty string) is required"
+
+    return {"Data": data.strip(), "Text_Update": text.strip()}, None
+
 
-    return True, {"Data": data.strip(), "Text_Update": text.strip()}
+def _validate_update_obj(payload: dict):
+    cleaned, error = _clean_update_obj(payload)
+    if error is not None:
+        return False, (jsonify({"error": error}), 400)
+    return True, cleaned
+
+
+def _utc_stamp(value: str) -> Optional[str]:
+    # ISO date or datetime -> the stored "created_at" shape, or None if invalid
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _bulk_items() -> Iterator[Tuple[int, Any]]:
+    # (line number, parsed item) from a JSON array body or, for any other
+    # content type, NDJSON read line by line off the request stream.
+    # Lines that aren't JSON come back as _NOT_JSON.
+    if request.mimetype == "application/json":
+        yield from enumerate(request.get_json(silent=True), 1)
+        return
+
+    for number, raw in enumerate(request.stream, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, _NOT_JSON
+
+
+def _read_bulk_updates():
+    """
+    Validates every item of a bulk body with the single-update rules.
+    An item may also carry "created_at" (ISO date or datetime) for
+    historical imports. Returns (True, (updates, errors)) or (False, response).
+    """
+    if request.mimetype == "application/json" and not isinstance(request.get_json(silent=True), list):
+        return False, (jsonify({"error": "JSON body must be an array"}), 400)
+
+    updates: List[Dict[str, str]] = []
+    errors: List[Dict[str, Any]] = []
+    for number, item in _bulk_items():
+        if len(updates) + len(errors) >= MAX_BULK_UPDATES:
+            return False, (jsonify({"error": f"At most {MAX_BULK_UPDATES} updates per request"}), 413)
+        if item is _NOT_JSON:
+            errors.append({"line": number, "error": "Not valid JSON"})
+            continue
+        if not isinstance(item, dict):
+            errors.append({"line": number, "error": "Update must be a JSON object"})
+            continue
+
+        cleaned, error = _clean_update_obj(item)
+        if error is None and "created_at" in item:
+            created_at = _utc_stamp(item["created_at"]) if isinstance(item["created_at"], str) else None
+            if created_at is None:
+                error = "Field 'created_at' must be an ISO date or datetime"
+            else:
+                cleaned["created_at"] = created_at
+        if error is not None:
+            errors.append({"line": number, "error": error})
+        else:
+            updates.append(cleaned)
+    return True, (updates, errors)
+
+
+def _parse_page_args(args):
+    # Query: ?limit=<int>&cursor=<epoch>.<offset>&since=<ISO date or datetime>&until=<...>&last=<int>
+    limit = args.get("limit")
+    cursor = args.get("cursor", "0")
+    since = args.get("since")
+    until = args.get("until")
+    last = args.get("last")
+
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return False, (jsonify({"error": "Query parameter 'limit' must be a positive integer"}), 400)
+        limit = int(limit)
+    # A cursor names the log epoch it was issued in, so a reordered log is
+    # detected; a bare number (older clients) has none and is only valid as 0
+    epoch, _, offset = cursor.rpartition(".")
+    if not offset.isdigit():
+        return False, (jsonify({"error": "Query parameter 'cursor' is invalid"}), 400)
+    if last is not None:
+        if not last.isdigit():
+            return False, (jsonify({"error": "Query parameter 'last' must be a non-negative integer"}), 400)
+        last = int(last)
+
+    if since is not None:
+        # Same shape as the stored "created_at", so plain string comparison works
+        since = _utc_stamp(since)
+        if since is None:
+            return False, (jsonify({"error": "Query parameter 'since' must be an ISO date or datetime"}), 400)
+    if until is not None:
+        stamp = _utc_stamp(until)
+        if stamp is None:
+            return False, (jsonify({"error": "Query parameter 'until' must be an ISO date or datetime"}), 400)
+        # A plain date covers that whole day
+        until = stamp[:10] if len(until) == 10 else stamp
+
+    return True, {
+        "limit": limit,
+        "cursor": int(offset),
+        "epoch": epoch,
+        "since": since,
+        "until": until,
+        "last": last,
+    }
+
+
+def _stream_updates(
+    user_id: str,
+    epoch: str,
+    records: Iterator[Tuple[Dict[str, Any], int]],
+    cursor: int,
+    limit: Optional[int],
+) -> Iterator[str]:
+    # Encodes {"user_id": ..., "updates": [...], "next_cursor": ...} one
+    # update at a time so long histories are never held in memory.
+    yield '{"user_id": %s, "updates": [' % json.dumps(user_id)
+
+    count = 0
+    position = cursor
+    next_cursor = None
+    for update, end in records:
+        if limit is not None and count >= limit:
+            next_cursor = f"{epoch}.{position}"
+            break
+        position = end
+        yield ("," if count else "") + json.dumps(update)
+        count += 1
+
+    yield '], "next_cursor": %s}' % json.dumps(next_cursor)
+
+
+def _event_stream(body: Iterator[str]) -> Response:
+    resp = Response(body, mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return resp
 
 
-def register_user_routes(lab: Lab) -> Blueprint:
+# -------------------------
+# Conditional GET helpers
+# -------------------------
+def _query_etag(etag: str) -> str:
+    # Same data, different query string => different representation
+    return hashlib.sha1(f"{etag}?{request.query_string.decode()}".encode("utf-8")).hexdigest()
+
+
+def _set_validators(resp: Response, etag: str, last_modified: Optional[float]) -> Response:
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    return resp
+
+
+def _not_modified(etag: str, last_modified: Optional[float]) -> Optional[Response]:
+    """
+    A 304 if the client's If-None-Match (or, failing that, If-Modified-Since)
+    still matches. Called before any JSON is read or serialized.
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matched = int(last_modified) <= request.if_modified_since.timestamp()
+    else:
+        matched = False
+    if not matched:
+        return None
+    return _set_validators(Response(status=304), etag, last_modified)
+
+
+def _dashboard_payload(user: User) -> Dict[str, Any]:
+    project, wet, dry = user.load_dashboard()
+    return {
+        "user_id": user.user_id,
+        "project_descriptions": project or {},
+        "wet_updates": wet or {},
+        "dry_updates": dry or {},
+    }
+
+
+def register_user_routes(lab: Lab, io_workers: int = 8) -> Blueprint:
+    # Bounded pool for batch dashboard reads
+    io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="dashboard-io")
+
     # -----------------------------------------
     # POST: create user
     # Body: {"user_id": "...", "name": "...", "role": "..."}
@@ -100,18 +309,83 @@ def register_user_routes(lab: Lab) -> Blueprint:
         if user is None:
             return jsonify({"error": "User not found"}), 404
 
-        project = user.load_project_description()
-        wet = user.load_update("wet")
-        dry = user.load_update("dry")
+        etag, last_modified = user.dashboard_version()
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
 
-        return jsonify(
-            {
-                "user_id": user_id,
-                "project_descriptions": project or {},
-                "wet_updates": wet or {},
-                "dry_updates": dry or {},
-            }
-        ), 200
+        return _set_validators(jsonify(_dashboard_payload(user)), etag, last_modified), 200
+
+    # -----------------------------------------
+    # GET: live changes as Server-Sent Events
+    # /users/<id>/events for one user, /events for the whole lab.
+    # Event types: update, project, wet, dry, summaries, overflow
+    # -----------------------------------------
+    @users_bp.get("/users/<user_id>/events")
+    def get_user_events(user_id: str):
+        if lab.get_user(user_id) is None:
+            return jsonify({"error": "User not found"}), 404
+        return _event_stream(lab.events.stream(user_id))
+
+    @users_bp.get("/events")
+    def get_lab_events():
+        return _event_stream(lab.events.stream())
+
+    # -----------------------------------------
+    # GET: many dashboards in one request
+    # Query: ?ids=123,999 (default: every user, optionally ?role=...)
+    # Each entry is the single-user dashboard plus name and role.
+    # -----------------------------------------
+    @users_bp.get("/dashboards")
+    def get_dashboards():
+        ids = request.args.get("ids")
+        if ids is not None:
+            user_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+        else:
+            user_ids = [row["user_id"] for row in lab.list_users(role=request.args.get("role"))]
+
+        if len(user_ids) > MAX_BATCH_DASHBOARDS:
+            return jsonify({"error": f"At most {MAX_BATCH_DASHBOARDS} users per request"}), 400
+
+        users = []
+        missing = []
+        for user_id in user_ids:
+            user = lab.get_user(user_id)
+            if user is None:
+                missing.append(user_id)
+            else:
+                users.append(user)
+
+        dashboards = []
+        for user, payload in zip(users, io_pool.map(_dashboard_payload, users)):
+            dashboards.append({**payload, "name": user.name, "role": user.role})
+
+        return jsonify({"dashboards": dashboards, "missing": missing}), 200
+
+    # -----------------------------------------
+    # GET: full-text search
+    # Query: ?q=pcr buffer&user_id=123&kind=update&limit=20
+    # Searches updates (Data/Text_Update), project Name/description and
+    # wet/dry documents; best matches first.
+    # -----------------------------------------
+    @users_bp.get("/search")
+    def search():
+        q = request.args.get("q", "")
+        user_id = request.args.get("user_id")
+        kind = request.args.get("kind")
+        limit = request.args.get("limit", "20")
+
+        if not q.strip():
+            return jsonify({"error": "Query parameter 'q' is required"}), 400
+        if kind is not None and kind not in KINDS:
+            return jsonify({"error": f"Query parameter 'kind' must be one of {', '.join(KINDS)}"}), 400
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_SEARCH_RESULTS:
+            return jsonify(
+                {"error": f"Query parameter 'limit' must be between 1 and {MAX_SEARCH_RESULTS}"}
+            ), 400
+
+        results = lab.search.search(q, user_id=user_id, kind=kind, limit=int(limit))
+        return jsonify({"q": q, "results": results}), 200
 
     # -----------------------------------------
     # POST: overwrite project description
@@ -157,6 +431,34 @@ def register_user_routes(lab: Lab) -> Blueprint:
         user.add_update(cleaned_or_err)
         return jsonify({"status": "ok", "update": cleaned_or_err}), 201
 
+    # -----------------------------------------
+    # POST: bulk import of updates (group commit)
+    # Body: NDJSON, one {"Data": "...", "Text_Update": "..."} per line
+    #       (or a JSON array with Content-Type: application/json)
+    # Each item may also set "created_at" for historical entries.
+    # Any invalid item => 400 with per-line errors and nothing stored,
+    # unless ?skip_invalid=1, which stores the valid items
+    # (200 instead of 201 if there were none).
+    # -----------------------------------------
+    @users_bp.post("/users/<user_id>/updates/bulk")
+    def post_user_updates_bulk(user_id: str):
+        user = lab.get_user(user_id)
+        if user is None:
+            return jsonify({"error": "User not found"}), 404
+
+        ok, parsed_or_err = _read_bulk_updates()
+        if not ok:
+            return parsed_or_err
+        updates, errors = parsed_or_err
+
+        if errors and request.args.get("skip_invalid") != "1":
+            return jsonify({"error": "Invalid updates; nothing was stored", "errors": errors}), 400
+        if not updates:
+            return jsonify({"status": "ok", "stored": 0, "errors": errors}), 200
+
+        records = user.add_updates(updates)
+        return jsonify({"status": "ok", "stored": len(records), "errors": errors}), 201
+
     # -----------------------------------------
     # POST: overwrite wet update
     # Body: {"Data": "...", "Text_Update": "..."}
@@ -202,7 +504,14 @@ def register_user_routes(lab: Lab) -> Blueprint:
         return jsonify({"status": "ok", "dry_update": cleaned_or_err}), 201
 
     # -----------------------------------------
-    # GET: all appended updates list
+    # GET: update history in date order (paginated, streamed)
+    # Query: ?limit=50&cursor=<next_cursor>&since=2026-01-01&until=2026-01-31
+    #        ?last=20 for the newest 20
+    # A cursor from before the history was reordered (e.g. a bulk import
+    # of older updates) gets 410; start again without one.
+    # since/until are inclusive; a plain date covers the whole day. Ranges
+    # are found through the log's date index, not by scanning the history.
+    # Without limit the whole (selected) history is streamed.
     # -----------------------------------------
     @users_bp.get("/users/<user_id>/updates")
     def get_user_updates(user_id: str):
@@ -210,20 +519,73 @@ def register_user_routes(lab: Lab) -> Blueprint:
         if user is None:
             return jsonify({"error": "User not found"}), 404
 
-        updates = user.load_past_updates()
-        return jsonify({"user_id": user_id, "updates": updates}), 200
+        ok, page_or_err = _parse_page_args(request.args)
+        if not ok:
+            return page_or_err
+
+        etag, last_modified = user.updates_version()
+        etag = _query_etag(etag)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            epoch, records = user.iter_past_updates(
+                page_or_err["cursor"],
+                since=page_or_err["since"],
+                until=page_or_err["until"],
+                last=page_or_err["last"],
+                epoch=page_or_err["epoch"],
+            )
+        except CursorExpiredError:
+            return jsonify(
+                {"error": "Cursor expired: the update history was reordered; start again without a cursor"}
+            ), 410
+        except ValueError:
+            return jsonify({"error": "Query parameter 'cursor' is invalid"}), 400
 
+        body = _stream_updates(user_id, epoch, records, page_or_err["cursor"], page_or_err["limit"])
+        resp = Response(body, status=200, mimetype="application/json")
+        return _set_validators(resp, etag, last_modified)
 
+
+    # -----------------------------------------
+    # GET: list users (optionally by role, paginated)
+    # Query: ?role=student&limit=100&cursor=<next_cursor>
+    # Without limit every matching user is returned.
+    # -----------------------------------------
     @users_bp.get("/users")
     def get_all_users():
+        role = request.args.get("role")
+        limit = request.args.get("limit")
+        cursor = request.args.get("cursor")
+
+        if limit is not None:
+            if not limit.isdigit() or int(limit) < 1:
+                return jsonify({"error": "Query parameter 'limit' must be a positive integer"}), 400
+            limit = int(limit)
+
+        etag = _query_etag(f"users-{lab.users_generation()}")
+        not_modified = _not_modified(etag, None)
+        if not_modified is not None:
+            return not_modified
+
+        # Fetch one extra row to know whether another page exists
+        rows = lab.list_users(role=role, limit=None if limit is None else limit + 1, after=cursor)
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["user_id"]
+
         users = [
             {
-                "user_id": user.user_id,
-                "name": user.name,
-                "email": getattr(user, "email", ""),
-                "role": user.role,
+                "user_id": row["user_id"],
+                "name": row["name"],
+                "email": "",
+                "role": row["role"],
             }
-            for user in lab._users.values()
+            for row in rows
         ]
-        return jsonify({"users": users}), 200
+        return _set_validators(jsonify({"users": users, "next_cursor": next_cursor}), etag, None), 200
+
     return users_bp
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import data_io
+
+# Document kinds stored in the index
+KINDS = ("update", "project", "wet", "dry")
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def document_fields(kind: str, doc: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (title, body) to index for one stored document:
+      update / wet / dry:   {"Data": "...", "Text_Update": "..."}
+      generated wet / dry:  {"latest": {"date": "...", "summary": "..."}}
+      project:              {"Name": "...", "description": "..."}
+    """
+    if kind == "project":
+        return str(doc.get("Name") or ""), str(doc.get("description") or "")
+    latest = doc.get("latest")
+    if isinstance(latest, dict):
+        return str(latest.get("date") or ""), str(latest.get("summary") or "")
+    return str(doc.get("Data") or ""), str(doc.get("Text_Update") or "")
+
+
+def to_match_query(q: str) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query: every word must match, the last
+    one as a prefix (search-as-you-type). User input never reaches the
+    FTS5 query syntax, so quotes or operators can't cause errors.
+    Returns None if `q` has no searchable words.
+    """
+    words = _TOKEN.findall(q)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """
+    Full-text index over the lab's data (SQLite FTS5):
+      Data/search.sqlite3
+
+    One row per appended update, plus one row per user for each of the
+    project description and the current wet/dry documents (replaced on
+    every write). Writers keep it up to date; rebuild_user() re-indexes
+    a user from the files on disk. Matches are ranked by bm25 and come
+    back with a highlighted snippet.
+    """
+
+    def __init__(self, path: str = "Data/search.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+                user_id UNINDEXED,
+                kind UNINDEXED,
+                created_at UNINDEXED,
+                title,
+                body,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        # "indexed" is set once a full rebuild from Data/ has completed
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def indexed(self) -> bool:
+        """
+        True once a full rebuild has finished (mark_indexed()). An index
+        whose rebuild crashed or was killed midway stays False, so the
+        rebuild runs again.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'indexed'").fetchone() is not None
+
+    def mark_indexed(self) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed', '1')")
+            self._conn.commit()
+
+    # -------------------------
+    # WRITERS
+    # -------------------------
+    def add_update(self, user_id: str, update: Dict[str, Any]) -> None:
+        self.add_updates(user_id, [update])
+
+    def add_updates(self, user_id: str, updates: List[Dict[str, Any]]) -> None:
+        with data_io("write", self.path), self._lock:
+            self._conn.executemany(
+                "INSERT INTO docs (user_id, kind, created_at, title, body) VALUES (?, 'update', ?, ?, ?)",
+                [
+                    (user_id, update.get("created_at", ""), *document_fields("update", update))
+                    for update in updates
+                ],
+            )
+            self._conn.commit()
+
+    def set_document(self, user_id: str, kind: str, doc: Optional[Dict[str, Any]]) -> None:
+        """Replaces the user's single `kind` document ("project", "wet" or "dry")."""
+        with data_io("write", self.path), self._lock:
+            self._replace(user_id, kind, doc)
+            self._conn.commit()
+
+    def _replace(self, user_id: str, kind: str, doc: Optional[Dict[str, Any]]) -> None:
+        self._conn.execute("DELETE FROM docs WHERE user_id = ? AND kind = ?", (user_id, kind))
+        if not doc:
+            return
+        title, body = document_fields(kind, doc)
+        self._conn.execute(
+            "INSERT INTO docs (user_id, kind, created_at, title, body) VALUES (?, ?, '', ?, ?)",
+            (user_id, kind, title, body),
+        )
+
+    def rebuild_user(
+        self,
+        user_id: str,
+        updates: List[Dict[str, Any]],
+        documents: Dict[str, Optional[Dict[str, Any]]],
+    ) -> None:
+        """Replaces everything indexed for `user_id` in one transaction."""
+        with data_io("write", self.path), self._lock:
+            self._conn.execute("DELETE FROM docs WHERE user_id = ?", (user_id,))
+            self._conn.executemany(
+                "INSERT INTO docs (user_id, kind, created_at, title, body) VALUES (?, 'update', ?, ?, ?)",
+                [
+                    (user_id, update.get("created_at", ""), *document_fields("update", update))
+                    for update in updates
+                ],
+            )
+            for kind, doc in documents.items():
+                self._replace(user_id, kind, doc)
+            self._conn.commit()
+
+    def optimize(self) -> None:
+        """Merges the index b-trees (worth running after a full rebuild)."""
+        with self._lock:
+            self._conn.execute("INSERT INTO docs (docs) VALUES ('optimize')")
+            self._conn.commit()
+
+    # -------------------------
+    # READERS
+    # -------------------------
+    def search(
+        self,
+        q: str,
+        user_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """
+        Best matches first:
+          [{"user_id", "kind", "created_at", "title", "body", "snippet"}, ...]
+        The snippet marks matched words as [word].
+        """
+        match = to_match_query(q)
+        if match is None:
+            return []
+
+        query = (
+            "SELECT user_id, kind, created_at, title, body, "
+            "snippet(docs, 4, '[', ']', '...', 16) "
+            "FROM docs WHERE docs MATCH ?"
+        )
+        params: list = [match]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        with data_io("read", self.path), self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "user_id": r[0],
+                "kind": r[1],
+                "created_at": r[2] or None,
+                "title": r[3],
+                "body": r[4],
+                "snippet": r[5],
+            }
+            for r in rows
+        ]
+
+
+if __name__ == "__main__":
+    # Index existing data: python search_index.py  (run from the backend directory)
+    from user_class import Lab
+
+    count = Lab().rebuild_search_index()
+    print(f"Indexed {count} users")
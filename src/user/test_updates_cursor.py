@@ -0,0 +1,47 @@
+from flask import Flask
+from routes import register_user_routes
+from user_class import Lab
+
+
+def test_cursor_expires_when_an_older_update_is_imported(tmp_path):
+    lab = Lab(data_root=str(tmp_path / "Data"))
+    lab.create_user(user_id="123", name="Alice", role="student")
+    app = Flask(__name__)
+    app.register_blueprint(register_user_routes(lab))
+    client = app.test_client()
+
+    updates = [{"Data": f"d{i}x", "Text_Update": "t", "created_at": f"2026-01-0{i + 1}"} for i in range(6)]
+    assert client.post("/users/123/updates/bulk", json=updates).status_code == 201
+
+    page = client.get("/users/123/updates?limit=3").get_json()
+    assert [u["Data"] for u in page["updates"]] == ["d0x", "d1x", "d2x"]
+    cursor = page["next_cursor"]
+
+    # Same epoch: the cursor resumes where the page ended
+    page = client.get(f"/users/123/updates?limit=3&cursor={cursor}").get_json()
+    assert [u["Data"] for u in page["updates"]] == ["d3x", "d4x", "d5x"]
+
+    # An older update reorders the log; the old cursor must not be honoured
+    historical = [{"Data": "old", "Text_Update": "t", "created_at": "2020-01-01"}]
+    assert client.post("/users/123/updates/bulk", json=historical).status_code == 201
+    resp = client.get(f"/users/123/updates?limit=3&cursor={cursor}")
+    assert resp.status_code == 410
+
+    # A bare byte offset (no epoch) can't be checked, so it is refused too
+    offset = cursor.rpartition(".")[2]
+    assert client.get(f"/users/123/updates?limit=3&cursor={offset}").status_code == 410
+
+    # Starting over pages through the reordered history without repeats
+    seen, cursor = [], "0"
+    while cursor is not None:
+        page = client.get(f"/users/123/updates?limit=3&cursor={cursor}").get_json()
+        seen += [u["Data"] for u in page["updates"]]
+        cursor = page["next_cursor"]
+    assert seen == ["old", "d0x", "d1x", "d2x", "d3x", "d4x", "d5x"]
+
+    # Nothing valid to store with ?skip_invalid=1: 200, not 201
+    invalid = [{"Data": "d"}, {"Text_Update": "t"}]
+    assert client.post("/users/123/updates/bulk", json=invalid).status_code == 400
+    resp = client.post("/users/123/updates/bulk?skip_invalid=1", json=invalid)
+    assert resp.status_code == 200
+    assert resp.get_json()["stored"] == 0
@@ -1,15 +1,165 @@
 from __future__ import annotations
 
-import json
 import os
-from typing import Dict, Any, Optional, List
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Iterator, Optional, List, Tuple
+
+from data_paths import DataPaths
+from events import EventBus
+from metrics import data_io
+from read_cache import ReadCache, files_version, load_json_file
+from safe_io import atomic_write_json, write_lock
+from search_index import SearchIndex
+from update_log import UpdateLog
+from user_registry import UserRegistry
+
+
+def _count_updates(record: Dict[str, Any], appended: List[Dict[str, Any]]) -> None:
+    meta = record.setdefault("updates", {"count": 0, "last_created_at": None})
+    meta["count"] += len(appended)
+    # Historical imports may be older than what is already stored
+    meta["last_created_at"] = max(
+        [meta["last_created_at"] or ""] + [str(u.get("created_at", "")) for u in appended]
+    ) or None
 
 
 class User:
-    def __init__(self, user_id: str, name: str, role: str):
+    def __init__(self, user_id: str, name: str, role: str, paths: Optional[DataPaths] = None):
         self.user_id = user_id
         self.name = name
         self.role = role
+        self._use_paths(paths or DataPaths())
+        # Shared document cache, event bus and search index, attached by Lab when the user is registered
+        self._cache: Optional[ReadCache] = None
+        self._events: Optional[EventBus] = None
+        self._search: Optional[SearchIndex] = None
+        # Serve project/wet/dry from the consolidated record (Lab(consolidated=True))
+        self._consolidated = False
+
+    def _use_paths(self, paths: DataPaths) -> None:
+        self._paths = paths
+        # Serializes this user's writers across threads and worker processes
+        self._lock_path = paths.lock(self.user_id)
+        self._updates = UpdateLog(
+            paths.user_file(self.user_id, "updates"),
+            legacy_path=paths.user_file(self.user_id, "legacy_updates"),
+            lock_path=self._lock_path,
+            relocate=lambda: self._claim("updates", "legacy_updates", "legacy_updates_migrated"),
+            index_path=paths.user_file(self.user_id, "updates_index"),
+        )
+
+    def _claim(self, *kinds: str) -> None:
+        # Moves files from the flat layout into this user's shard (write lock held)
+        for kind in kinds:
+            self._paths.claim(self.user_id, kind)
+
+    def _read_json(self, kind: str) -> Any:
+        path = self._paths.resolve(self.user_id, kind)
+        data = self._load(path)
+        if data is None and path != self._paths.user_file(self.user_id, kind):
+            # Moved into its shard between resolve() and the read
+            data = self._load(self._paths.user_file(self.user_id, kind))
+        return data
+
+    def _load(self, path: str) -> Any:
+        if self._cache is None:
+            return load_json_file(path)
+        return self._cache.get(path, lambda: load_json_file(path))
+
+    # -------------------------
+    # CONSOLIDATED RECORD
+    # -------------------------
+    def _record(self) -> Dict[str, Any]:
+        """
+        Reads the compact per-user record:
+          Data/records/{shard}/{user_id}_record.json
+
+        Expected:
+          {"project": {...} | null, "wet": {...}, "dry": {...},
+           "updates": {"count": 12, "last_created_at": "..."}}
+        Built from the separate files the first time it is needed.
+        """
+        path = self._paths.user_file(self.user_id, "record")
+        record = self._load(path)
+        if isinstance(record, dict):
+            return record
+        with write_lock(self._lock_path):
+            record = load_json_file(path)
+            if not isinstance(record, dict):
+                record = self._build_record()
+                atomic_write_json(path, record, indent=None)
+        self._invalidate(path)
+        return record
+
+    def _build_record(self) -> Dict[str, Any]:
+        # Straight from disk: the separate files stay the source of truth
+        def read(kind: str) -> Any:
+            return load_json_file(self._paths.resolve(self.user_id, kind))
+
+        updates = self._updates.read_all()
+        project = read("projects")
+        wet = read("wet")
+        dry = read("dry")
+        return {
+            "project": project if isinstance(project, dict) else None,
+            "wet": wet if isinstance(wet, dict) else {},
+            "dry": dry if isinstance(dry, dict) else {},
+            "updates": {
+                "count": len(updates),
+                "last_created_at": updates[-1].get("created_at") if updates else None,
+            },
+        }
+
+    def _update_record(self, change: Callable[[Dict[str, Any]], None]) -> None:
+        # Called with the write lock held, after the separate files were written
+        path = self._paths.user_file(self.user_id, "record")
+        if not self._consolidated:
+            # A record left by an earlier consolidated run would now go stale
+            try:
+                with data_io("write", path):
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        record = load_json_file(path)
+        if isinstance(record, dict):
+            change(record)
+        else:
+            record = self._build_record()
+        atomic_write_json(path, record, indent=None)
+        self._invalidate(path)
+
+    def _invalidate(self, path: str) -> None:
+        if self._cache is not None:
+            self._cache.invalidate(path)
+
+    def _publish(self, event: str, data: Dict[str, Any]) -> None:
+        if self._events is not None:
+            self._events.publish(self.user_id, event, data)
+
+    def _index(self, kind: str, doc: Dict[str, Any]) -> None:
+        if self._search is not None:
+            self._search.set_document(self.user_id, kind, doc)
+
+    def reindex(self) -> None:
+        """
+        Rebuilds this user's search entries from the files on disk, under
+        the write lock so no concurrent write is lost or indexed twice.
+        """
+        if self._search is None:
+            return
+        with write_lock(self._lock_path):
+            self._search.rebuild_user(
+                self.user_id,
+                self.load_past_updates(),
+                {
+                    "project": self.load_project_description(),
+                    "wet": self.load_update("wet"),
+                    "dry": self.load_update("dry"),
+                },
+            )
 
     # -------------------------
     # READERS
@@ -17,51 +167,79 @@ class User:
     def load_project_description(self) -> Optional[Dict[str, Any]]:
         """
         Reads flat JSON:
-          Data/project_descriptions/{user_id}_projects.json
+          Data/project_descriptions/{shard}/{user_id}_projects.json
 
         Expected:
           {"Name": "...", "description": "..."}
         Returns None if missing.
         """
-        try:
-            with open(f"Data/project_descriptions/{self.user_id}_projects.json", "r") as file:
-                data = json.load(file)
-                return data if isinstance(data, dict) else None
-        except FileNotFoundError:
-            return None
+        if self._consolidated:
+            return self._record()["project"]
+        data = self._read_json("projects")
+        return data if isinstance(data, dict) else None
 
     def load_update(self, update_type: str) -> Dict[str, Any]:
         """
         Reads:
-          Data/updates/{user_id}_{update_type}_updates.json
+          Data/updates/{shard}/{user_id}_{update_type}_updates.json
 
         update_type: "wet" or "dry"
         Expected object:
           {"Data": "...", "Text_Update": "..."}
         Returns {} if missing.
         """
-        try:
-            with open(f"Data/updates/{self.user_id}_{update_type}_updates.json", "r") as file:
-                data = json.load(file)
-                return data if isinstance(data, dict) else {}
-        except FileNotFoundError:
-            return {}
+        if self._consolidated:
+            return self._record()[update_type]
+        data = self._read_json(update_type)
+        return data if isinstance(data, dict) else {}
+
+    def load_dashboard(self) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+        """(project, wet, dry); a single cached read in consolidated mode."""
+        if self._consolidated:
+            record = self._record()
+            return record["project"], record["wet"], record["dry"]
+        return self.load_project_description(), self.load_update("wet"), self.load_update("dry")
 
     def load_past_updates(self) -> List[Dict[str, Any]]:
         """
-        Reads append-only list:
-          Data/updates/{user_id}_updates.json
+        Reads append-only log:
+          Data/updates/{shard}/{user_id}_updates.jsonl
 
         Expected list:
           [{"Data": "...", "Text_Update": "..."}, ...]
         Returns [] if missing.
         """
-        try:
-            with open(f"Data/updates/{self.user_id}_updates.json", "r") as file:
-                data = json.load(file)
-                return data if isinstance(data, list) else []
-        except FileNotFoundError:
-            return []
+        return self._updates.read_all()
+
+    def iter_past_updates(
+        self,
+        cursor: int = 0,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        last: Optional[int] = None,
+        epoch: Optional[str] = None,
+    ) -> Tuple[str, Iterator[Tuple[Dict[str, Any], int]]]:
+        """
+        Streams the date-ordered log from byte offset `cursor`, yielding
+        (update, next_cursor) pairs without loading the whole history.
+        since/until (inclusive, "created_at" shape or a plain date) and
+        last (newest N) are looked up in the log's date index.
+        Returns (epoch, pairs): a cursor is only valid with its epoch.
+        Raises CursorExpiredError if `epoch` is not the log's current one
+        (it was reordered since) and ValueError for a cursor that is not a
+        record boundary.
+        """
+        return self._updates.query(cursor, since=since, until=until, last=last, epoch=epoch)
+
+    def dashboard_version(self) -> Tuple[str, Optional[float]]:
+        """(ETag, Last-Modified) of the dashboard documents, from file metadata only."""
+        if self._consolidated:
+            return files_version([self._paths.user_file(self.user_id, "record")])
+        return files_version([self._paths.resolve(self.user_id, kind) for kind in ("projects", "wet", "dry")])
+
+    def updates_version(self) -> Tuple[str, Optional[float]]:
+        """(ETag, Last-Modified) of the append-only update log."""
+        return self._updates.version()
 
     # -------------------------
     # WRITERS
@@ -69,73 +247,182 @@ class User:
     def add_project(self, project: Dict[str, Any]) -> None:
         """
         Overwrites:
-          Data/project_descriptions/{user_id}_projects.json
+          Data/project_descriptions/{shard}/{user_id}_projects.json
 
         Expected:
           {"Name": "...", "description": "..."}
         """
-        os.makedirs("Data/project_descriptions", exist_ok=True)
-        with open(f"Data/project_descriptions/{self.user_id}_projects.json", "w") as file:
-            json.dump(project, file, indent=2)
+        with write_lock(self._lock_path):
+            path = self._paths.claim(self.user_id, "projects")
+            atomic_write_json(path, project)
+            self._update_record(lambda record: record.update(project=project))
+            self._index("project", project)
+        self._invalidate(path)
+        self._publish("project", {"project": project})
 
     def add_update(self, update: Dict[str, Any]) -> None:
         """
-        Appends to:
-          Data/updates/{user_id}_updates.json
+        Appends one line to:
+          Data/updates/{shard}/{user_id}_updates.jsonl
 
         Expected:
           {"Data": "...", "Text_Update": "..."}
+        Stored with a "created_at" UTC timestamp (used by ?since=).
         """
-        os.makedirs("Data/updates", exist_ok=True)
-
-        try:
-            with open(f"Data/updates/{self.user_id}_updates.json", "r") as file:
-                updates = json.load(file)
-                if not isinstance(updates, list):
-                    updates = []
-        except FileNotFoundError:
-            updates = []
-
-        updates.append(update)
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        record = {**update, "created_at": created_at}
+        with write_lock(self._lock_path):
+            self._updates.append(record)
+            self._update_record(lambda r: _count_updates(r, [record]))
+            # Indexed under the lock so a concurrent reindex() sees it exactly once
+            if self._search is not None:
+                self._search.add_update(self.user_id, record)
+        self._publish("update", {"update": record})
 
-        with open(f"Data/updates/{self.user_id}_updates.json", "w") as file:
-            json.dump(updates, file, indent=2)
+    def add_updates(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Bulk form of add_update: all records are appended with one write
+        and fsync. An update may carry its own "created_at" (historical
+        imports); the rest are stamped with the current time.
+        Publishes a single "updates" event; returns the stored records.
+        """
+        if not updates:
+            return []
+        created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        records = [{**update, "created_at": update.get("created_at", created_at)} for update in updates]
+        with write_lock(self._lock_path):
+            self._updates.append_many(records)
+            self._update_record(lambda r: _count_updates(r, records))
+            if self._search is not None:
+                self._search.add_updates(self.user_id, records)
+        self._publish("updates", {"count": len(records)})
+        return records
 
     def save_wet_update(self, wet_obj: Dict[str, Any]) -> None:
         """
         Overwrites:
-          Data/updates/{user_id}_wet_updates.json
+          Data/updates/{shard}/{user_id}_wet_updates.json
 
         Expected:
           {"Data": "...", "Text_Update": "..."}
         """
-        os.makedirs("Data/updates", exist_ok=True)
-        with open(f"Data/updates/{self.user_id}_wet_updates.json", "w") as file:
-            json.dump(wet_obj, file, indent=2)
+        with write_lock(self._lock_path):
+            path = self._paths.claim(self.user_id, "wet")
+            atomic_write_json(path, wet_obj)
+            self._update_record(lambda record: record.update(wet=wet_obj))
+            self._index("wet", wet_obj)
+        self._invalidate(path)
+        self._publish("wet", {"wet_update": wet_obj})
 
     def save_dry_update(self, dry_obj: Dict[str, Any]) -> None:
         """
         Overwrites:
-          Data/updates/{user_id}_dry_updates.json
+          Data/updates/{shard}/{user_id}_dry_updates.json
 
         Expected:
           {"Data": "...", "Text_Update": "..."}
         """
-        os.makedirs("Data/updates", exist_ok=True)
-        with open(f"Data/updates/{self.user_id}_dry_updates.json", "w") as file:
-            json.dump(dry_obj, file, indent=2)
+        with write_lock(self._lock_path):
+            path = self._paths.claim(self.user_id, "dry")
+            atomic_write_json(path, dry_obj)
+            self._update_record(lambda record: record.update(dry=dry_obj))
+            self._index("dry", dry_obj)
+        self._invalidate(path)
+        self._publish("dry", {"dry_update": dry_obj})
 
 
 class Lab:
-    def __init__(self) -> None:
-        self._users: Dict[str, User] = {}
+    """
+    Users live in a persistent UserRegistry; User objects are only built
+    when a user is looked up, and the most recently used `max_users` of
+    them are kept for reuse (an evicted user is rebuilt from the registry).
+
+    With consolidated=True each user also gets a compact record (project,
+    current wet/dry, update count) that serves dashboards in one read.
+    The separate files are still written, so the mode can be switched off.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 1024,
+        max_users: int = 1024,
+        consolidated: bool = False,
+        data_root: Optional[str] = None,
+        registry_path: Optional[str] = None,
+        search_path: Optional[str] = None,
+    ) -> None:
+        self.max_users = max_users
+        self._users: "OrderedDict[str, User]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.consolidated = consolidated
+        # data_root defaults to $DATA_ROOT, then "Data"
+        self.paths = DataPaths(data_root)
+        self.paths.finish_if_migrated()
+        self.cache = ReadCache(max_entries=cache_size)
+        self.events = EventBus()
+        self.registry = UserRegistry(registry_path or self.paths.shared("users.sqlite3"))
+        self.search = SearchIndex(search_path or self.paths.shared("search.sqlite3"))
+
+    def _materialize(self, user_id: str, name: str, role: str) -> User:
+        user = User(user_id=user_id, name=name, role=role, paths=self.paths)
+        user._cache = self.cache
+        user._events = self.events
+        user._search = self.search
+        user._consolidated = self.consolidated
+        with self._lock:
+            return self._remember(self._users.get(user_id) or user)
+
+    def _remember(self, user: User) -> User:
+        # Lock held
+        self._users[user.user_id] = user
+        self._users.move_to_end(user.user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return user
 
     def get_user(self, user_id: str) -> Optional[User]:
-        return self._users.get(user_id)
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+                return user
+        row = self.registry.get(user_id)
+        if row is None:
+            return None
+        return self._materialize(row["user_id"], row["name"], row["role"])
 
     def create_user(self, user_id: str, name: str, role: str) -> User:
-        if user_id in self._users:
+        if not self.registry.insert(user_id, name, role):
             raise ValueError("User already exists")
-        user = User(user_id=user_id, name=name, role=role)
-        self._users[user_id] = user
-        return user
+        return self._materialize(user_id, name, role)
+
+    def users_generation(self) -> int:
+        """Changes whenever a user is added or replaced (for GET /users ETags)."""
+        return self.registry.generation()
+
+    def list_users(
+        self,
+        role: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """Registry rows (user_id, name, role), without building User objects."""
+        return self.registry.list(role=role, limit=limit, after=after)
+
+    def rebuild_search_index(self, if_needed: bool = False) -> int:
+        """
+        Re-indexes every registered user from Data/ and then marks the
+        index complete; returns the user count. With if_needed=True it
+        does nothing if a rebuild has already completed. One process
+        rebuilds at a time; the others wait and then find it done.
+        """
+        with write_lock(self.paths.shared(os.path.join("locks", "search_rebuild.lock"))):
+            if if_needed and self.search.indexed():
+                return 0
+            count = 0
+            for row in self.list_users():
+                self.get_user(row["user_id"]).reindex()
+                count += 1
+            self.search.optimize()
+            self.search.mark_indexed()
+        return count